@@ -8,14 +8,16 @@ Script principal que integra todas as etapas do projeto:
 
 import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
 from core.discovery import crawl_site
 from core.downloader import download_files_parallel
 from core.extractor import extract_metadata_from_files
 from core.metadata import save_metadata
-from core.utils import setup_directories
-from core.parallel_runner import run_discovery_parallel
+from core.utils import install_dns_cache, setup_directories
+from core.parallel_runner import run_discovery_parallel, run_metadata_parallel
 
 # lista de sites base (pags de atas dos municipios)
 RPPS_SITES = [
@@ -30,23 +32,82 @@ def parse_args():
         default=str(project_root / "data"),
         help="Diretório base de saída (default: ./data dentro do projeto)"
     )
+    parser.add_argument(
+        "--discovery-workers",
+        type=int,
+        default=4,
+        help="Quantos sites rodar em paralelo no discovery (default: 4)"
+    )
+    parser.add_argument(
+        "--download-site-workers",
+        type=int,
+        default=4,
+        help="Quantos sites baixar em paralelo na fase de download (default: 4)"
+    )
+    parser.add_argument(
+        "--extract-text",
+        action="store_true",
+        help="Extrai o texto dos documentos (um processo por core) para achar "
+             "tipo e data da reunião (default: só metadados mínimos, texto fica pra IA)"
+    )
     return parser.parse_args()
 
+def process_site(site_name, links, base_out, extract_text=False):
+    # download + metadados + relatório individual de um site
+    site = next(s for s in RPPS_SITES if s["name"] == site_name)
+    print(f"[OK] {site['name']} → {len(links)} links encontrados")
+
+    if not links:
+        print(f"Nenhuma ata encontrada para {site['name']}. Pulando...\n")
+        return []
+
+    base_path = setup_directories(site["name"], site["uf"], base_out)
+
+    # DOWNLOAD PARALELO
+    downloaded_files = download_files_parallel(
+        links,
+        base_path,
+        rpps_info=site,
+        workers=6
+    )
+
+    # extrai metadados e analisa tipo e data das reuniões
+    # (gerador; lista porque o relatório percorre duas vezes e o main junta tudo)
+    if extract_text:
+        # texto em cache por conteúdo: reexecução não extrai de novo
+        metadata = list(run_metadata_parallel(
+            downloaded_files, site, cache_dir=base_path / ".texto"
+        ))
+    else:
+        metadata = list(extract_metadata_from_files(downloaded_files, site))
+
+    # RELATÓRIO INDIVIDUAL
+    out_dir = base_path / "relatorios"
+    out_dir.mkdir(exist_ok=True)
+    save_metadata(metadata, out_dir)
+
+    print(f"✔ {site['name']} finalizado ({len(downloaded_files)} arquivos)\n")
+    return metadata
+
 def main():
     # funcao principal que roda o fluxo completo
     args = parse_args()
     base_out = Path(args.out)
     base_out.mkdir(parents=True, exist_ok=True)
 
+    # resolução de DNS cacheada para todo o processo (discovery + download)
+    install_dns_cache()
+
     print("\nIniciando discovery paralelo...\n")
 
     # -------------------------------
     # DISCOVERY PARALELO (fase 1)
     # -------------------------------
+    # estado do crawl em SQLite → reexecutar após queda retoma de onde parou
     all_sites_links = run_discovery_parallel(
     RPPS_SITES,
-    crawl_site,
-    4
+    partial(crawl_site, state_db=base_out / ".crawl_state.db"),
+    args.discovery_workers
 )
 
     print("\nDiscovery concluído!\n")
@@ -54,36 +115,18 @@ def main():
     # -------------------------------
     # DOWNLOAD + METADADOS (fase 2)
     # -------------------------------
+    # sites em paralelo: cada um já baixa com seu próprio pool, mas com
+    # muitos sites (hosts diferentes) o gargalo era esperar um site de cada vez
     all_metadata = []
 
-    for site_name, links in all_sites_links.items():
-        site = next(s for s in RPPS_SITES if s["name"] == site_name)
-        print(f"[OK] {site['name']} → {len(links)} links encontrados")
-
-        if not links:
-            print(f"Nenhuma ata encontrada para {site['name']}. Pulando...\n")
-            continue
-
-        base_path = setup_directories(site["name"], site["uf"], base_out)
-
-        # DOWNLOAD PARALELO
-        downloaded_files = download_files_parallel(
-            links,
-            base_path,
-            rpps_info=site,
-            workers=6
-        )
-
-        # extrai metadados e analisa tipo e data das reuniões
-        metadata = extract_metadata_from_files(downloaded_files, site)
-        all_metadata.extend(metadata)
-
-        # RELATÓRIO INDIVIDUAL
-        out_dir = base_path / "relatorios"
-        out_dir.mkdir(exist_ok=True)
-        save_metadata(metadata, out_dir)
-
-        print(f"✔ {site['name']} finalizado ({len(downloaded_files)} arquivos)\n")
+    with ThreadPoolExecutor(max_workers=args.download_site_workers) as executor:
+        futures = [
+            executor.submit(process_site, site_name, links, base_out, args.extract_text)
+            for site_name, links in all_sites_links.items()
+        ]
+        # ordem dos sites preservada no relatório consolidado
+        for future in futures:
+            all_metadata.extend(future.result())
 
     # -------------------------------
     # RELATÓRIO CONSOLIDADO
@@ -0,0 +1,84 @@
+"""
+estado do crawl persistido em SQLite (WAL) pra poder retomar um discovery
+que caiu no meio (crash, Ctrl+C, máquina reiniciada) sem refazer tudo.
+
+guarda por site: visitados, fronteira (url/profundidade/score) e achados.
+quando o crawl termina normalmente o estado do site é apagado, então a
+próxima execução começa do zero.
+"""
+
+import sqlite3
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS visited (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (site, url)
+);
+CREATE TABLE IF NOT EXISTS frontier (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    PRIMARY KEY (site, url)
+);
+CREATE TABLE IF NOT EXISTS found (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (site, url)
+);
+"""
+
+
+def open_state_db(path):
+    # uma conexão por crawl_site (conexões sqlite não são compartilhadas entre threads)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def load_state(conn, site):
+    # devolve (visited, frontier, found); frontier vazia = nada pra retomar
+    visited = {r[0] for r in conn.execute("SELECT url FROM visited WHERE site=?", (site,))}
+    frontier = conn.execute(
+        "SELECT url, depth, score FROM frontier WHERE site=? ORDER BY score DESC",
+        (site,),
+    ).fetchall()
+    found = [r[0] for r in conn.execute(
+        "SELECT url FROM found WHERE site=? ORDER BY rowid", (site,)
+    )]
+    return visited, frontier, found
+
+
+def save_batch(conn, site, new_visited, frontier, new_found):
+    """
+    Grava o progresso de um lote numa única transação.
+    frontier é o snapshot atual: lista de (url, depth, score).
+    """
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO visited (site, url) VALUES (?, ?)",
+            [(site, u) for u in new_visited],
+        )
+        conn.execute("DELETE FROM frontier WHERE site=?", (site,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO frontier (site, url, depth, score) VALUES (?, ?, ?, ?)",
+            [(site, u, d, s) for u, d, s in frontier],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO found (site, url) VALUES (?, ?)",
+            [(site, u) for u in new_found],
+        )
+
+
+def clear_state(conn, site):
+    # crawl concluído → próxima execução começa do zero
+    with conn:
+        conn.execute("BEGIN")
+        for table in ("visited", "frontier", "found"):
+            conn.execute(f"DELETE FROM {table} WHERE site=?", (site,))
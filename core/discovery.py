@@ -17,25 +17,39 @@ Objetivo:
 - Ser genérico o bastante pra escalar para todos os ~3.000 sites.
 """
 
+import os
 import time
+import atexit
+import queue
 import random
 import re
-from collections import deque
-from urllib.parse import urljoin, urlparse, parse_qs
+import heapq
+import itertools
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
 from .downloader import is_probably_meeting_document  # filtro semântico reaproveitado
+from .utils import parse_url
+from .page_parser import (
+    DOC_EXTS, URL_CACHE_SIZE, collect_docs_from_links, domain_of,
+    element_text_score, extract_docs_from_html, extract_internal_links,
+    extract_links, is_download_hub_candidate, parse_page, resolve_href,
+    split_base, url_blacklisted,
+)
+from .crawl_state import open_state_db, load_state, save_batch, clear_state
 import urllib3
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-import time
 import threading
 import sys
-import re
 
 skip_current_url = False  # controla pular apenas a URL atual
 
@@ -46,8 +60,19 @@ def listen_for_skip():
             print("[MANUAL SKIP] ENTER detectado → pulando URL atual")
             skip_current_url = True
 
-# inicia thread
-threading.Thread(target=listen_for_skip, daemon=True).start()
+_skip_listener_lock = threading.Lock()
+_skip_listener_started = False
+
+
+def start_skip_listener():
+    # inicia a thread na primeira chamada do crawl_site, não no import: o
+    # servidor do forkserver (pool de parse) importa este módulo e precisa
+    # continuar com uma thread só para os forks dele serem seguros
+    global _skip_listener_started
+    with _skip_listener_lock:
+        if not _skip_listener_started:
+            threading.Thread(target=listen_for_skip, daemon=True).start()
+            _skip_listener_started = True
 
 # --- Monitor de travamento ---
 last_progress_time = time.time()
@@ -72,32 +97,33 @@ MAX_PAGES_FROM_SITE = 120    # limite de páginas por domínio
 
 REQUEST_TIMEOUT = 5
 MAX_REQUEST_RETRIES = 3
-REQUEST_BACKOFF = (1.5, 3.0)
-
-DOC_EXTS = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".htm", ".html")
-
-# Heurística de contexto de atas
-HEUR_KEYWORDS = [
-    "ata", "atas",
-    "reuni", "reunião", "reuniao",
-    "comit", "comitê", "comite",
-    "invest", "investimento", "investimentos",
-    "conselho", "consel", "deliberativo", "fiscal",
-]
-
-# URLs que nunca ou quase nunca interessam para atas
-GLOBAL_BLACKLIST_SUBSTR = [
-    "diariomunicipal", "diario-oficial", "diariooficial",
-    "licitacao", "licitacoes", "pregao", "compras",
-    "edital", "concurso",
-    "legislacao", "legislação", "lei", "leis",
-    "noticia", "notícias", "noticias",
-    "ouvidoria",
-    "portal-da-transparencia", "portal_transparencia", "transparencia",
-    "contato", "fale-conosco", "faleconosco",
-    "login", "auth", "sso", "senha",
-    "rh", "recursos-humanos",
-]
+REQUEST_BACKOFF_BASE = 0.5   # backoff exponencial: base * 2**tentativa + jitter
+REQUEST_BACKOFF_MAX = 30
+FETCH_WORKERS = 8            # GETs simultâneos por lote da fronteira
+PARSE_WORKERS = os.cpu_count() or 1   # processos de parse (1 = parse na thread do crawl)
+PARSE_BATCH_TIMEOUT = 60     # segundos para o pool parsear um lote antes do parse local
+MAX_HTML_BYTES = 2 * 1024 * 1024   # teto de leitura por página HTML
+HTML_CHUNK_SIZE = 8192
+NEG_CACHE_TTL = 600          # segundos que uma URL que falhou fica sem nova tentativa
+NEG_CACHE_MAX = 4096         # entradas no cache negativo (LRU)
+HOST_CONCURRENCY = 4         # GETs simultâneos por host (somando todos os sites)
+HOST_FAIL_THRESHOLD = 5      # falhas de rede seguidas até abrir o circuito do host
+HOST_BLOCK_SECONDS = 300     # tempo que o host fica bloqueado depois disso
+DRIVER_MAX_RUNS = 200        # páginas renderizadas antes de reciclar um Chrome
+DRIVER_POOL_MAX = 4          # Chromes ociosos mantidos no pool
+SELENIUM_WORKERS = 3         # páginas renderizadas em paralelo por lote (um Chrome cada)
+DOM_QUIET_SECONDS = 0.3      # DOM sem mutações por esse tempo = página estável
+DOM_POLL_SECONDS = 0.1
+
+# padrões usados dentro de loops por página/elemento, compilados uma vez
+_ID_PARAM_RE = re.compile(r"id=(\d+)")
+_HTML_END_RE = re.compile(rb"</html>", re.I)  # sem .lower() (cópia) de cada chunk
+_PDF_URL_RE = re.compile(r'https?://[^"\']+\.pdf', re.I)
+_ATENDE_ARQUIVO_RE = re.compile(r'/cidadao/arquivo/\d+', re.I)
+_ARQUIVO_ID_RE = re.compile(r'/arquivo/\d+', re.I)
+
+# parâmetros de rastreamento: não mudam a página, só duplicam a URL
+TRACKING_QUERY_KEYS = frozenset(("fbclid", "gclid", "msclkid"))
 
 # Links de navegação geral para não clicar com Selenium
 NAV_BLACKLIST_TEXT = [
@@ -118,272 +144,373 @@ REQUEST_HEADERS_LIST = [
 ]
 
 # ----------------------------------------------------------------------
-# Helpers básicos
+# Helpers de URL do crawl (os usados no parse ficam em page_parser)
 # ----------------------------------------------------------------------
 
-def domain_of(url: str) -> str:
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def canonicalize(url: str) -> str:
+    """
+    Forma canônica de uma URL para chave de visitados (não é a URL buscada):
+    host minúsculo, sem porta padrão, sem fragmento, sem utm_*/fbclid,
+    query ordenada e sem barra final no path.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
     try:
-        return urlparse(url).netloc
-    except Exception:
-        return ""
+        port = parts.port
+    except ValueError:
+        port = None
+    if port and (scheme, port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{port}"
 
+    query = ""
+    if parts.query:
+        query = urlencode(sorted(
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith("utm_") and k.lower() not in TRACKING_QUERY_KEYS
+        ))
 
-def same_domain(a: str, b: str) -> bool:
-    return domain_of(a) == domain_of(b)
+    path = parts.path or "/"
+    if path != "/" and path.endswith("/"):
+        path = path[:-1]
+    return urlunsplit((scheme, host, path, query, ""))
 
 
-def url_blacklisted(url: str) -> bool:
-    if not url:
-        return False
-    ul = url.lower()
-    return any(b in ul for b in GLOBAL_BLACKLIST_SUBSTR)
+def pick_headers():
+    return random.choice(REQUEST_HEADERS_LIST)
 
 
-def looks_like_file(url: str) -> bool:
-    if not url:
-        return False
-    u = url.lower().split("?", 1)[0]
-    return any(u.endswith(ext) for ext in DOC_EXTS)
+# Session única do discovery: reaproveita conexões keep-alive (TCP+TLS) entre
+# as centenas de GETs no mesmo host. Compartilhada pelas threads do pool de
+# fetch (que vivem só um lote, então Session por thread não reaproveitaria nada).
+SESSION = requests.Session()
+# verify=False vai em cada chamada: com trust_env (padrão), REQUESTS_CA_BUNDLE /
+# CURL_CA_BUNDLE no ambiente sobrescrevem o verify da Session
+# pool padrão (10 conexões por host) é menor que sites × FETCH_WORKERS;
+# excedente seria aberto e descartado a cada request. Retries ficam no safe_get.
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0)
+SESSION.mount("http://", _http_adapter)
+SESSION.mount("https://", _http_adapter)
 
 
-def is_download_hub_candidate(url: str) -> bool:
-    """
-    Heurística para páginas tipo "downloads.php?cat=7" (Jaraguá do Sul, etc.):
-    - path contendo download(s)/arquivo/documento
-    - OU query com chaves tipo cat, categoria, tipo, idCategoria etc.
-    """
-    if not url:
-        return False
-    parsed = urlparse(url)
-    path = parsed.path.lower()
-    qs = parse_qs(parsed.query.lower())
+# ----------------------------------------------------------------------
+# Cache negativo — URLs mortas linkadas por várias páginas (e por vários
+# sites, no caso de CDNs em comum) só pagam os retries uma vez
+# ----------------------------------------------------------------------
+_neg_cache = OrderedDict()   # url -> (expira_em, motivo)
+_neg_cache_lock = threading.Lock()
 
-    path_hits = any(x in path for x in ["download", "downloads", "arquivo", "arquivos", "document", "docs", "publica"])
-    query_hits = any(k in qs for k in ["cat", "categoria", "idcategoria", "tipo", "idcat"])
 
-    return path_hits and query_hits
+def neg_cache_hit(url: str) -> bool:
+    with _neg_cache_lock:
+        entry = _neg_cache.get(url)
+        if entry is None:
+            return False
+        if entry[0] < time.time():
+            del _neg_cache[url]
+            return False
+        _neg_cache.move_to_end(url)
+        return True
 
 
-def pick_headers():
-    return random.choice(REQUEST_HEADERS_LIST)
+def neg_cache_add(url: str, reason: str):
+    with _neg_cache_lock:
+        _neg_cache[url] = (time.time() + NEG_CACHE_TTL, reason)
+        _neg_cache.move_to_end(url)
+        while len(_neg_cache) > NEG_CACHE_MAX:
+            _neg_cache.popitem(last=False)
 
 
-def safe_get(url: str, timeout: int = REQUEST_TIMEOUT):
+# ----------------------------------------------------------------------
+# Limite por host — vários sites rodam em paralelo (parallel_runner) e cada
+# um busca lotes em paralelo; sites no mesmo servidor dividem o limite
+# ----------------------------------------------------------------------
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+
+def get_host_semaphore(host: str):
+    # cria semáforo por host de forma thread-safe
+    if host in _host_semaphores:
+        return _host_semaphores[host]
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(HOST_CONCURRENCY)
+        return _host_semaphores[host]
+
+
+# ----------------------------------------------------------------------
+# Circuit breaker por host — host fora do ar não consome
+# retries × timeout em cada URL da fronteira
+# ----------------------------------------------------------------------
+_host_fails = Counter()
+_host_blocked_until = {}
+_host_fails_lock = threading.Lock()
+
+
+def host_blocked(host: str) -> bool:
+    return _host_blocked_until.get(host, 0) > time.time()
+
+
+def host_failed(host: str):
+    # só falha de rede (timeout, conexão recusada...) conta, não HTTP 404
+    with _host_fails_lock:
+        _host_fails[host] += 1
+        if _host_fails[host] >= HOST_FAIL_THRESHOLD:
+            _host_blocked_until[host] = time.time() + HOST_BLOCK_SECONDS
+            _host_fails[host] = 0
+            print(f"[DISCOVERY] Host {host} bloqueado por {HOST_BLOCK_SECONDS}s "
+                  f"({HOST_FAIL_THRESHOLD} falhas seguidas)")
+
+
+def host_ok(host: str):
+    if _host_fails.get(host):
+        with _host_fails_lock:
+            _host_fails[host] = 0
+
+
+def safe_get(url: str, timeout: int = REQUEST_TIMEOUT, stream: bool = False):
     """
     GET com retries + backoff, exclusivo para HTML/texto.
+    Com stream=True o corpo não é lido aqui (ver safe_get_text).
+    Falhas definitivas vão para o cache negativo por NEG_CACHE_TTL segundos.
+    Host com HOST_FAIL_THRESHOLD falhas de rede seguidas fica bloqueado
+    por HOST_BLOCK_SECONDS (circuit breaker).
     """
+    if neg_cache_hit(url):
+        return None
+
+    host = domain_of(url)
+    if host_blocked(host):
+        return None
+
+    host_sem = get_host_semaphore(host)
     last_exc = None
-    for _ in range(MAX_REQUEST_RETRIES):
+    reason = None
+    for attempt in range(MAX_REQUEST_RETRIES):
         try:
-            r = requests.get(url, headers=pick_headers(), timeout=timeout, verify=False, allow_redirects=True)
-            if r.status_code == 200 and r.text:
+            with host_sem:
+                r = SESSION.get(url, headers=pick_headers(), timeout=timeout,
+                                allow_redirects=True, stream=stream, verify=False)
+            host_ok(host)
+            if r.status_code == 200 and (stream or r.text):
                 return r
+            reason = f"HTTP {r.status_code}" if r.status_code != 200 else "corpo vazio"
+            r.close()
         except Exception as e:
             last_exc = e
-        time.sleep(random.uniform(*REQUEST_BACKOFF))
+            reason = repr(e)
+            host_failed(host)
+            if host_blocked(host):
+                break
+        if attempt + 1 < MAX_REQUEST_RETRIES:
+            time.sleep(
+                min(REQUEST_BACKOFF_MAX, REQUEST_BACKOFF_BASE * 2 ** attempt)
+                + random.random()
+            )
     if last_exc:
         print(f"[DISCOVERY] Falha GET {url}: {last_exc}")
+    neg_cache_add(url, reason or "desconhecido")
     return None
 
 
-# ----------------------------------------------------------------------
-# Score de links (priorizar coisas relevantes)
-# ----------------------------------------------------------------------
-
-def element_text_score(text: str, href: str) -> int:
+def read_capped_text(resp, max_bytes: int = MAX_HTML_BYTES) -> str:
     """
-    Pontua um link com base no texto anchora + URL.
+    Lê o corpo em chunks e para no </html> ou em max_bytes.
+    Páginas de portal enormes (banners, JSON embutido) não são baixadas
+    inteiras só para extrair meia dúzia de <a>.
     """
-    score = 0
-    t = (text or "").lower()
-    h = (href or "").lower()
-    full = t + " " + h
-
-    for k in HEUR_KEYWORDS:
-        if k in full:
-            score += 8
-
-    # páginas que costumam ter docs
-    if any(x in h for x in ["ata", "atas", "download", "downloads", "arquivo", "document", "docs"]):
-        score += 6
-
-    # anos
-    if re.search(r"\b(19|20)\d{2}\b", full):
-        score += 6
-
-    # penalização se for claramente navegação genérica
-    if any(x in full for x in ["portal da transparência", "transparência", "transparencia", "ouvidoria", "noticia", "notícias"]):
-        score -= 12
-
-    if url_blacklisted(h):
-        score -= 20
-
-    return score
-
-def is_atende_net(url: str) -> bool:
-    return "atende.net" in (url or "").lower()
+    chunks = []
+    total = 0
+    tail = b""   # fim do chunk anterior: pega </html> partido entre dois chunks
+    try:
+        for chunk in resp.iter_content(HTML_CHUNK_SIZE):
+            chunks.append(chunk)
+            total += len(chunk)
+            window = tail + chunk
+            if total >= max_bytes or _HTML_END_RE.search(window):
+                break
+            tail = window[-6:]
+    finally:
+        resp.close()
+    return b"".join(chunks).decode(resp.encoding or "utf-8", errors="replace")
 
-# ----------------------------------------------------------------------
-# Extração estática de links de documentos e hubs
-# ----------------------------------------------------------------------
 
-def extract_docs_from_html(base_url: str, html: str):
+def safe_get_text(url: str, timeout: int = REQUEST_TIMEOUT):
     """
-    Extrai links de documentos a partir de HTML, incluindo:
-    - PDFs diretos
-    - DOC/DOCX
-    - links de hubs de download
-    - plugins como WP Download Manager (wpdmdl)
+    GET em streaming que devolve só o HTML (limitado a MAX_HTML_BYTES) ou None.
     """
-    if not html:
-        return []
-
-    soup = BeautifulSoup(html, "lxml")
-    found = []
+    resp = safe_get(url, timeout=timeout, stream=True)
+    if not resp:
+        return None
+    try:
+        return read_capped_text(resp) or None
+    except Exception as e:
+        print(f"[DISCOVERY] Falha lendo {url}: {e}")
+        return None
 
-    # 1) anchors diretos
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
-        abs_url = urljoin(base_url, href)
-        text = a.get_text(strip=True) or ""
 
-        # excluir lixo
-        if url_blacklisted(abs_url):
-            continue
+_parser_pool = None
+_parser_pool_lock = threading.Lock()
 
-        # arquivos diretos
-        if looks_like_file(abs_url):
-            fname = abs_url.split("/")[-1]
-            if is_probably_meeting_document(fname) or is_probably_meeting_document(text):
-                found.append(abs_url)
-            continue
 
-        # páginas de download
-        full = (text + " " + abs_url).lower()
-        if "download" in abs_url.lower() or "arquivo" in abs_url.lower():
-            if any(k in full for k in HEUR_KEYWORDS):
-                found.append(abs_url)
+def get_parser_pool():
+    # pool de processos criado sob demanda e compartilhado entre os sites.
+    # forkserver, não fork: o crawl tem dezenas de threads (sites, fetch,
+    # Selenium, stdin) e um fork herdando lock preso por outra thread trava
+    # o worker. O servidor importa __main__ e page_parser uma vez só, sem
+    # threads; os workers são forks dele e não reimportam nada
+    global _parser_pool
+    if _parser_pool is None:
+        with _parser_pool_lock:
+            if _parser_pool is None:
+                ctx = multiprocessing.get_context("forkserver")
+                ctx.set_forkserver_preload(["__main__", parse_page.__module__])
+                _parser_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=ctx)
+    return _parser_pool
 
-    # 2) iframe/embed/object
-    for tag in soup.find_all(["iframe", "embed", "object"]):
-        src = tag.get("src") or tag.get("data")
-        if not src:
-            continue
-        abs_url = urljoin(base_url, src)
-        if url_blacklisted(abs_url):
-            continue
-        if looks_like_file(abs_url):
-            fname = abs_url.split("/")[-1]
-            if is_probably_meeting_document(fname):
-                found.append(abs_url)
-        elif "download" in abs_url.lower():
-            found.append(abs_url)
-
-    # 3) padrões de PDF embutidos em JS
-    import re
-    for m in re.findall(r'["\'](https?://[^"\']+\.(?:pdf|docx?|xlsx?))["\']', html, flags=re.I):
-        if not url_blacklisted(m):
-            if is_probably_meeting_document(m.split("/")[-1]):
-                found.append(m)
-
-    # 4) Hubs tipo downloads.php?cat=xx
-    if is_download_hub_candidate(base_url):
-        found.append(base_url)
-
-    # 5) *** PATCH PARA SITES COM wpdmdl (ex: IPREV/SC) ***
-    wpdmdl_matches = re.findall(r'href=["\']([^"\']+\?wpdmdl=\d+)', html, flags=re.I)
-    for u in wpdmdl_matches:
-        abs_url = urljoin(base_url, u)
-        found.append(abs_url)
 
-    # dedupe
-    seen = set()
-    out = []
-    for u in found:
-        if u not in seen:
-            seen.add(u)
-            out.append(u)
-
-    return out
-
-def extract_internal_links(base_url: str, html: str):
+def parse_batch(urls, htmls):
     """
-    Retorna links internos (mesmo domínio) com score de relevância.
+    Parse de um lote em processos separados (fora do GIL).
+    Se o pool quebrar (worker morto, ambiente sem forkserver) ou não devolver
+    o lote em PARSE_BATCH_TIMEOUT segundos, faz o parse aqui mesmo.
     """
-    if not html:
-        return []
-
-    soup = BeautifulSoup(html, "lxml")
-    base_domain = domain_of(base_url)
-    candidates = []
-
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
-        abs_url = urljoin(base_url, href)
-        text = a.get_text(strip=True) or ""
+    global _parser_pool
+    if PARSE_WORKERS > 1 and len(urls) > 1:
+        pool = get_parser_pool()
+        try:
+            return list(pool.map(parse_page, urls, htmls, timeout=PARSE_BATCH_TIMEOUT))
+        except Exception as e:
+            print(f"[DISCOVERY][PARSE] pool de processos falhou ({e!r}) — parse local")
+            with _parser_pool_lock:
+                if _parser_pool is pool:
+                    _parser_pool = None
+            # encerra os workers do pool quebrado (senão ficam órfãos até o fim)
+            pool.shutdown(wait=False, cancel_futures=True)
+    return [parse_page(u, h) for u, h in zip(urls, htmls)]
 
-        if url_blacklisted(abs_url):
-            continue
 
-        if domain_of(abs_url) != base_domain:
-            continue
+def fetch_batch_parallel(urls, workers: int = FETCH_WORKERS):
+    """
+    Busca um lote de URLs da fronteira em paralelo (threads, I/O)
+    e faz o parse no pool de processos.
+    Retorna {url: (html, docs, internal_scored)}; o estado do crawl
+    continua sendo alterado só na thread principal.
+    """
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as ex:
+        htmls = [h or "" for h in ex.map(safe_get_text, urls)]
+    parsed = parse_batch(urls, htmls)
+    return {
+        u: (h, docs, internal)
+        for u, h, (docs, internal) in zip(urls, htmls, parsed)
+    }
 
-        score = element_text_score(text, abs_url)
 
-        # boost se parece hub (?cat=7, downloads.php etc.)
-        if is_download_hub_candidate(abs_url):
-            score += 30
+def is_atende_net(url: str) -> bool:
+    return "atende.net" in (url or "").lower()
 
-        candidates.append((score, abs_url))
+# ----------------------------------------------------------------------
+# Espera por DOM estável — MutationObserver na página + leitura de uma
+# flag, no lugar de sleeps fixos (que esperam demais em página rápida)
+# ----------------------------------------------------------------------
+_JS_DOM_OBSERVER = (
+    "window.__domChanged = false;"
+    "new MutationObserver(function () { window.__domChanged = true; })"
+    ".observe(document.documentElement,"
+    " {subtree: true, childList: true, attributes: true});"
+)
 
-    # ordena por score desc e remove repetições
-    candidates.sort(key=lambda x: x[0], reverse=True)
+# lê e zera a flag; página nova (navegação após clique) reinstala o observer
+_JS_DOM_CHANGED = (
+    "if (window.__domChanged === undefined) {" + _JS_DOM_OBSERVER + " return true; }"
+    "var x = window.__domChanged; window.__domChanged = false; return x;"
+)
 
-    seen = set()
-    ordered = []
-    for score, url in candidates:
-        if url not in seen and score > 0:
-            seen.add(url)
-            ordered.append((score, url))
 
-    return ordered
+def selenium_wait_dom_quiet(driver, timeout: float, quiet: float = DOM_QUIET_SECONDS):
+    """
+    Espera até o DOM ficar `quiet` segundos sem mutações, no máximo `timeout`
+    (o antigo sleep fixo vira o teto). Se o JS falhar, dorme o timeout inteiro.
+    """
+    deadline = time.time() + timeout
+    last_change = time.time()
+    try:
+        driver.execute_script(_JS_DOM_CHANGED)
+    except Exception:
+        time.sleep(timeout)
+        return
+    while time.time() < deadline:
+        time.sleep(DOM_POLL_SECONDS)
+        try:
+            if driver.execute_script(_JS_DOM_CHANGED):
+                last_change = time.time()
+            elif time.time() - last_change >= quiet:
+                return
+        except Exception:
+            return
 
 # ----------------------------------------------------------------------
 # PATCH B — funções adicionais para guiar Selenium em menus dinâmicos
 # ----------------------------------------------------------------------
 
+TAB_CANDIDATES_XPATH = (
+    "//a[contains(.,'Ata') or contains(.,'Reuni') or contains(.,'Arquivo') "
+    "or contains(.,'Comit') or contains(.,'Invest') or contains(.,'Ano') "
+    "or contains(@href, '#') or contains(@class, 'tab') or contains(@class,'active')]"
+)
+
+# clica (na ordem do documento) todo elemento do XPath; devolve quantos eram
+_JS_CLICK_ALL_XPATH = """
+var r = document.evaluate(arguments[0], document, null,
+                          XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (var i = 0; i < r.snapshotLength; i++) {
+    try { r.snapshotItem(i).click(); } catch (e) {}
+}
+return r.snapshotLength;
+"""
+
+
 def selenium_force_click_tabs(driver):
     """
     Clica em abas, menus e botões que frequentemente escondem as atas.
     """
-    candidates = driver.find_elements(
-        By.XPATH,
-        "//a[contains(.,'Ata') or contains(.,'Reuni') or contains(.,'Arquivo') "
-        "or contains(.,'Comit') or contains(.,'Invest') or contains(.,'Ano') "
-        "or contains(@href, '#') or contains(@class, 'tab') or contains(@class,'active')]"
-    )
-    for el in candidates:
-        try:
-            driver.execute_script("arguments[0].click();", el)
-            time.sleep(0.3)
-        except:
-            pass
+    # mesmo XPath de antes, avaliado e clicado dentro do browser num único
+    # execute_script (antes: um round-trip + sleep(0.3) por elemento)
+    try:
+        clicked = driver.execute_script(_JS_CLICK_ALL_XPATH, TAB_CANDIDATES_XPATH)
+    except Exception:
+        return
+    if clicked:
+        selenium_wait_dom_quiet(driver, 1.5)
+
+
+# <option> cujo texto é um ano (4 dígitos), de todos os <select> da página
+_JS_YEAR_OPTIONS = """
+return Array.from(document.querySelectorAll('select option')).filter(function (o) {
+    return /^\\d{4}$/.test((o.text || '').trim());
+});
+"""
 
 
 def selenium_force_select_years(driver):
     """
     Seleciona automaticamente dropdowns contendo anos.
     """
-    selects = driver.find_elements(By.TAG_NAME, "select")
-    for sel in selects:
+    # um único querySelectorAll no browser no lugar de find_elements por
+    # <select> + .text por <option> (um round-trip cada)
+    try:
+        options = driver.execute_script(_JS_YEAR_OPTIONS) or []
+    except Exception:
+        return
+    for op in options:
         try:
-            options = sel.find_elements(By.TAG_NAME, "option")
-            for op in options:
-                txt = op.text.strip()
-                if txt.isdigit() and len(txt) == 4:
-                    driver.execute_script("arguments[0].selected = true;", op)
-                    op.click()
-                    time.sleep(0.6)
+            driver.execute_script("arguments[0].selected = true;", op)
+            op.click()
+            selenium_wait_dom_quiet(driver, 0.6)
         except:
             pass
 
@@ -411,7 +538,7 @@ def selenium_force_scroll_and_paginate(driver):
                 "or contains(@class,'next') or contains(@rel,'next')]"
             )
             driver.execute_script("arguments[0].click();", btn)
-            time.sleep(1)
+            selenium_wait_dom_quiet(driver, 1)
         except:
             break
 
@@ -419,6 +546,14 @@ def selenium_force_scroll_and_paginate(driver):
 # Selenium setup e helpers
 # ----------------------------------------------------------------------
 
+# recursos irrelevantes para achar links (Network.setBlockedURLs aceita curinga *)
+SELENIUM_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*",
+]
+
 def make_driver():
     options = Options()
     options.add_argument("--headless=new")
@@ -428,15 +563,104 @@ def make_driver():
     options.add_argument("--window-size=1300,900")
     options.add_experimental_option("excludeSwitches", ["enable-automation"])
     options.add_experimental_option("useAutomationExtension", False)
+    # discovery só lê links: imagens não precisam nem ser baixadas
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+    })
+    # page_source logo após o DOMContentLoaded; o que vem depois (JS tardio)
+    # já é coberto pelo selenium_wait_dom_quiet
+    options.page_load_strategy = "eager"
     try:
         driver = webdriver.Chrome(options=options)
         driver.set_page_load_timeout(30)
+        try:
+            # corta mídia, fontes e analytics pelo DevTools (menos bytes e menos JS)
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": SELENIUM_BLOCKED_URLS})
+        except Exception as e:
+            print(f"[DISCOVERY] CDP indisponível, sem bloqueio de recursos: {e}")
         return driver
     except Exception as e:
         print(f"[DISCOVERY] Falha ao iniciar Chrome Selenium: {e}")
         return None
 
 
+# ----------------------------------------------------------------------
+# Pool de drivers — subir um Chrome custa 1-3 s; reaproveita entre sites e
+# entre chamadas de selenium_extract_links. Reciclado após DRIVER_MAX_RUNS
+# páginas para não acumular memória.
+# ----------------------------------------------------------------------
+_driver_pool = queue.LifoQueue()
+_driver_runs = {}
+_driver_runs_lock = threading.Lock()
+
+
+def driver_alive(driver) -> bool:
+    # selenium_render_and_get_html mata o driver quando falha
+    try:
+        driver.execute_script("return 1")
+        return True
+    except Exception:
+        return False
+
+
+def get_driver():
+    """
+    Pega um driver ocioso do pool (o mais recente primeiro) ou cria um novo.
+    Pode devolver None se o Chrome não subir.
+    """
+    while True:
+        try:
+            driver = _driver_pool.get_nowait()
+        except queue.Empty:
+            return make_driver()
+        if driver_alive(driver):
+            return driver
+        discard_driver(driver)
+
+
+def return_driver(driver, runs: int = 1):
+    """
+    Devolve o driver ao pool contabilizando `runs` páginas renderizadas;
+    passou de DRIVER_MAX_RUNS (ou morreu) → quit.
+    """
+    if driver is None:
+        return
+    with _driver_runs_lock:
+        total = _driver_runs.get(driver, 0) + runs
+        _driver_runs[driver] = total
+    if (
+        total >= DRIVER_MAX_RUNS
+        or _driver_pool.qsize() >= DRIVER_POOL_MAX
+        or not driver_alive(driver)
+    ):
+        discard_driver(driver)
+        return
+    _driver_pool.put(driver)
+
+
+def discard_driver(driver):
+    with _driver_runs_lock:
+        _driver_runs.pop(driver, None)
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def shutdown_driver_pool():
+    # fecha os Chromes ociosos no fim do processo
+    while True:
+        try:
+            discard_driver(_driver_pool.get_nowait())
+        except queue.Empty:
+            return
+
+
+atexit.register(shutdown_driver_pool)
+
+
 def selenium_render_and_get_html(driver, url: str):
     """
     Renderiza uma página com Selenium de forma segura.
@@ -451,7 +675,7 @@ def selenium_render_and_get_html(driver, url: str):
         driver.set_script_timeout(15)
 
         driver.get(url)
-        time.sleep(1.5)
+        selenium_wait_dom_quiet(driver, 1.5)
 
         # scroll leve para lazy load
         for _ in range(3):
@@ -473,18 +697,75 @@ def selenium_render_and_get_html(driver, url: str):
 
         return None
 
+# coleta no próprio browser: um execute_script devolve [tag, href/src, texto]
+# das âncoras e embeds, sem baixar page_source e re-parsear. Cada elemento
+# devolvido é marcado com data-harvested, então os cliques seguintes na mesma
+# página só trazem o que apareceu de novo (acordeões de ano/mês etc.)
+_JS_HARVEST = """
+return Array.from(
+    document.querySelectorAll(
+        'a[href]:not([data-harvested]), iframe:not([data-harvested]), ' +
+        'embed:not([data-harvested]), object:not([data-harvested])')
+).map(function (e) {
+    e.setAttribute('data-harvested', '1');
+    if (e.tagName === 'A') {
+        return ['A', e.getAttribute('href'),
+                (e.textContent || '').replace(/\\s+/g, ' ').trim()];
+    }
+    return [e.tagName, e.getAttribute('src') || e.getAttribute('data') || '', ''];
+});
+"""
+
+# elementos clicáveis com texto/href lidos no browser (evita 2 RPCs por elemento)
+_JS_CLICKABLES = """
+return Array.from(document.querySelectorAll('a, button')).map(function (e) {
+    // como el.text do Selenium: elemento invisível não tem texto
+    var visible = e.getClientRects().length > 0;
+    return [e, visible ? (e.innerText || '').trim() : '',
+            e.href || e.getAttribute('href') || ''];
+});
+"""
+
+_WPDM_HREF_RE = re.compile(r"[^\"']+\?wpdmdl=\d+", re.I)
+
+
+def selenium_harvest_docs(driver, base_url: str):
+    """
+    Documentos da página atual do driver via _JS_HARVEST (só elementos
+    ainda não coletados nesta página — o chamador acumula os resultados).
+    Mesmo filtro do extract_docs_from_html (âncoras, embeds, wpdmdl);
+    se o JS falhar, cai no page_source.
+    """
+    try:
+        rows = driver.execute_script(_JS_HARVEST) or []
+    except Exception:
+        return extract_docs_from_html(base_url, driver.page_source)
+
+    anchors = [(href or "", text or "") for tag, href, text in rows if tag == "A"]
+    embeds = [src for tag, src, _ in rows if tag != "A"]
+
+    base = split_base(base_url)
+    found = collect_docs_from_links(base, anchors, embeds)
+    for href, _ in anchors:
+        if _WPDM_HREF_RE.fullmatch(href):
+            found.append(resolve_href(base, href))
+
+    return list(dict.fromkeys(found))
+
+
 def selenium_click_promising_and_collect(driver, base_url: str):
     out = []
     try:
-        elements = driver.find_elements(By.XPATH, "//a|//button")
+        # um round-trip só: [elemento, texto visível, href] de cada a/button
+        rows = driver.execute_script(_JS_CLICKABLES) or []
     except Exception:
         return out
 
     scored = []
-    for el in elements:
+    for el, txt, href in rows:
         try:
-            txt = el.text or ""
-            href = el.get_attribute("href") or ""
+            txt = txt or ""
+            href = href or ""
             full = (txt + " " + href).lower()
 
             if any(nb in full for nb in NAV_BLACKLIST_TEXT):
@@ -504,8 +785,8 @@ def selenium_click_promising_and_collect(driver, base_url: str):
             driver.execute_script("arguments[0].scrollIntoView(true);", el)
             time.sleep(0.2)
             el.click()
-            time.sleep(1)
-            out.extend(extract_docs_from_html(base_url, driver.page_source))
+            selenium_wait_dom_quiet(driver, 1)
+            out.extend(selenium_harvest_docs(driver, base_url))
         except:
             continue
 
@@ -520,10 +801,10 @@ def extract_links_from_page(url: str):
     Extração estática simples de links de documentos (sem Selenium).
     Mantida por compatibilidade.
     """
-    resp = safe_get(url)
-    if not resp:
+    html = safe_get_text(url)
+    if not html:
         return []
-    return extract_docs_from_html(url, resp.text)
+    return extract_docs_from_html(url, html)
 
 
 def selenium_extract_links(url: str):
@@ -531,7 +812,7 @@ def selenium_extract_links(url: str):
     Extração mais agressiva em UMA página usando Selenium.
     Mantida por compatibilidade.
     """
-    driver = make_driver()
+    driver = get_driver()
     if not driver:
         return extract_links_from_page(url)
 
@@ -540,10 +821,7 @@ def selenium_extract_links(url: str):
         found = extract_docs_from_html(url, html or "")
         found.extend(selenium_click_promising_and_collect(driver, url))
     finally:
-        try:
-            driver.quit()
-        except Exception:
-            pass
+        return_driver(driver)
 
     # dedupe
     seen = set()
@@ -553,7 +831,7 @@ def selenium_extract_links(url: str):
             seen.add(u)
             result.append(u)
     return result
-import time
+
 
 def extract_atende_embedded_documents(html: str, base_url: str):
     """
@@ -564,15 +842,15 @@ def extract_atende_embedded_documents(html: str, base_url: str):
 
     try:
         # PDFs explícitos
-        for m in re.findall(r'https?://[^"\']+\.pdf', html, flags=re.I):
+        for m in _PDF_URL_RE.findall(html):
             docs.append(m)
 
         # URLs relativas comuns do Atende.net
-        for m in re.findall(r'/cidadao/arquivo/\d+', html, flags=re.I):
+        for m in _ATENDE_ARQUIVO_RE.findall(html):
             docs.append(urljoin(base_url, m))
 
         # fallback genérico
-        for m in re.findall(r'/arquivo/\d+', html, flags=re.I):
+        for m in _ARQUIVO_ID_RE.findall(html):
             docs.append(urljoin(base_url, m))
 
     except Exception:
@@ -586,15 +864,12 @@ def selenium_click_arquivos_tab(driver) -> bool:
     Retorna True se conseguiu clicar.
     """
     try:
-        # tenta <a> e <button>
-        elements = driver.find_elements(
-            "xpath",
-            "//a | //button"
-        )
+        # tenta <a> e <button> (texto lido no browser, um round-trip só)
+        rows = driver.execute_script(_JS_CLICKABLES) or []
 
-        for el in elements:
+        for el, text, _ in rows:
             try:
-                text = (el.text or "").strip().lower()
+                text = (text or "").strip().lower()
                 if text == "arquivos":
                     driver.execute_script(
                         "arguments[0].scrollIntoView({block:'center'});",
@@ -605,7 +880,7 @@ def selenium_click_arquivos_tab(driver) -> bool:
                         "arguments[0].click();",
                         el
                     )
-                    time.sleep(2)
+                    selenium_wait_dom_quiet(driver, 2)
                     return True
             except Exception:
                 continue
@@ -632,7 +907,7 @@ def looks_like_xhr_repository(base_url: str) -> bool:
 
     for suffix in ("/pasta/", "/arquivo/"):
         try:
-            r = requests.options(base + suffix, timeout=4, verify=False)
+            r = SESSION.options(base + suffix, timeout=4, verify=False)
             if r.status_code in (200, 204):
                 return True
         except:
@@ -649,7 +924,7 @@ def try_list_folders(api_base: str):
 
     for payload in payload_variants:
         try:
-            r = requests.post(
+            r = SESSION.post(
                 api_base + "/pasta/",
                 json=payload,
                 headers={
@@ -658,7 +933,7 @@ def try_list_folders(api_base: str):
                     "Referer": api_base + "/"
                 },
                 timeout=6,
-                verify=False
+                verify=False,
             )
             if r.ok:
                 data = r.json()
@@ -679,7 +954,7 @@ def try_list_files(api_base: str, folder_id):
 
     for payload in payload_variants:
         try:
-            r = requests.post(
+            r = SESSION.post(
                 api_base + "/arquivo/",
                 json=payload,
                 headers={
@@ -688,7 +963,7 @@ def try_list_files(api_base: str, folder_id):
                     "Referer": api_base + "/"
                 },
                 timeout=6,
-                verify=False
+                verify=False,
             )
             if r.ok:
                 data = r.json()
@@ -741,7 +1016,7 @@ def discover_sitemap_urls(base_url: str, timeout: int = 8) -> list[str]:
     Tenta descobrir URLs a partir de sitemap.xml padrão.
     Não faz crawling recursivo pesado.
     """
-    parsed = urlparse(base_url)
+    parsed = parse_url(base_url)
     root = f"{parsed.scheme}://{parsed.netloc}"
 
     candidates = [
@@ -754,7 +1029,7 @@ def discover_sitemap_urls(base_url: str, timeout: int = 8) -> list[str]:
 
     for sm_url in candidates:
         try:
-            resp = requests.get(sm_url, timeout=timeout, verify=False)
+            resp = SESSION.get(sm_url, timeout=timeout, verify=False)
             if not resp.ok or not resp.text:
                 continue
 
@@ -798,14 +1073,57 @@ def filter_relevant_sitemap_urls(urls: list[str], limit: int = 40) -> list[str]:
 
     return relevant
 
-def crawl_site(base_url: str, max_depth: int = MAX_CRAWL_DEPTH):
+def selenium_process_url(url: str, promising: bool):
+    """
+    Renderiza uma URL num driver do pool e devolve (html_dyn, dyn_docs).
+    promising=True → também força abas/anos/paginação e clica nos elementos
+    promissores. Roda em threads: cada chamada usa o seu próprio Chrome.
     """
-    Faz crawling BFS no site:
+    driver = get_driver()
+    if driver is None:
+        return None, []
+
+    runs = 0
+    try:
+        html_dyn = selenium_render_and_get_html(driver, url)
+        runs += 1
+
+        # abas/anos/paginação só depois de navegar (antes clicavam na página
+        # anterior do driver); o HTML é relido com o conteúdo expandido
+        if promising and html_dyn:
+            try:
+                selenium_force_click_tabs(driver)
+                selenium_force_select_years(driver)
+                selenium_force_scroll_and_paginate(driver)
+                html_dyn = driver.page_source
+            except Exception:
+                pass
+
+        dyn_docs = []
+        if promising and html_dyn:
+            dyn_docs = extract_docs_from_html(url, html_dyn)
+            dyn_docs.extend(selenium_click_promising_and_collect(driver, url))
+        return html_dyn, dyn_docs
+    finally:
+        # driver volta limpo (fora de iframe) pro próximo uso
+        try:
+            driver.switch_to.default_content()
+        except Exception:
+            pass
+        return_driver(driver, runs)
+
+
+def crawl_site(base_url: str, max_depth: int = MAX_CRAWL_DEPTH, state_db=None):
+    """
+    Faz crawling best-first no site (fronteira ordenada por score):
+      - busca lotes da fronteira em paralelo (FETCH_WORKERS)
       - segue links internos
       - detecta hubs (?cat=7 etc)
       - identifica páginas de detalhe (?id=123)
       - usa Selenium como fallback quando necessário
+      - com state_db, grava o progresso a cada lote e retoma de onde parou
     """
+    start_skip_listener()
 
     # ============================================================
     # PATCH XHR REPOSITORY — tentativa rápida antes do BFS pesado
@@ -820,129 +1138,206 @@ def crawl_site(base_url: str, max_depth: int = MAX_CRAWL_DEPTH):
         print(f"[DISCOVERY][XHR][ERRO] {e}")
     # ============================================================
 
+    global skip_current_url
+
     base_domain = domain_of(base_url)
     all_found_files = []
 
-    queue = deque([(base_url, 0)])
+    # fronteira best-first: (-score, profundidade, ordem de chegada, url)
+    # hubs com score alto (?cat=7 etc.) saem antes da navegação genérica
+    frontier = []
+    order = itertools.count()
+    heapq.heappush(frontier, (0, 0, next(order), base_url))
     visited = set()
-    driver = make_driver()
 
-    sitemap_used = False
+    # ------------------------------------------------------------
+    # Estado persistido (opcional) — retoma crawl interrompido
+    # ------------------------------------------------------------
+    state_conn = None
+    if state_db:
+        try:
+            state_conn = open_state_db(state_db)
+            saved_visited, saved_frontier, saved_found = load_state(state_conn, base_url)
+            if saved_frontier:
+                visited = saved_visited
+                all_found_files = saved_found
+                frontier = []
+                for url, depth, score in saved_frontier:
+                    heapq.heappush(frontier, (-score, depth, next(order), url))
+                print(
+                    f"[DISCOVERY][RESUME] {base_url} → {len(visited)} visitadas, "
+                    f"{len(frontier)} na fronteira, {len(all_found_files)} achados"
+                )
+        except Exception as e:
+            print(f"[DISCOVERY][STATE][ERRO] {e}")
+            state_conn = None
 
-    try:
-        while queue and len(visited) < MAX_PAGES_FROM_SITE:
+    # set espelhando all_found_files: checagem O(1) em vez de varrer a lista
+    found_set = set(all_found_files)
 
-            url, depth = queue.popleft()
+    def add_found(u):
+        if u not in found_set:
+            found_set.add(u)
+            all_found_files.append(u)
 
-            if url in visited:
-                continue
-            visited.add(url)
+    # sobe (ou reaproveita) um Chrome só pra saber se Selenium está disponível;
+    # ele volta pro pool e é o primeiro a ser usado pelos renders do lote
+    driver = get_driver()
+    selenium_ok = driver is not None
+    return_driver(driver, 0)
+    selenium_pool = ThreadPoolExecutor(max_workers=SELENIUM_WORKERS) if selenium_ok else None
 
-            if depth > max_depth:
-                continue
-            if url_blacklisted(url):
-                continue
-            if domain_of(url) != base_domain:
-                continue
+    sitemap_used = False
 
-            print(f"[DISCOVERY] Visitando {url} (profundidade {depth})")
+    try:
+        while frontier and len(visited) < MAX_PAGES_FROM_SITE:
 
             # ------------------------------------------------------------
-            # PATCH WPDM — tratar como arquivo direto
+            # Monta o próximo lote com as URLs de maior score
             # ------------------------------------------------------------
-            if "wpdmdl=" in url.lower():
-                if url not in all_found_files:
-                    all_found_files.append(url)
-                continue
+            batch = []
+            batch_visited = []
+            found_before = len(all_found_files)
+
+            while (
+                frontier
+                and len(batch) < FETCH_WORKERS
+                and len(visited) < MAX_PAGES_FROM_SITE
+            ):
+                _, depth, _, url = heapq.heappop(frontier)
+
+                # visitados por forma canônica (#ancora, utm_, host em
+                # maiúsculas, barra final etc. não viram páginas novas)
+                key = canonicalize(url)
+                if key in visited:
+                    continue
+                visited.add(key)
+                batch_visited.append(key)
+
+                if depth > max_depth:
+                    continue
+                if url_blacklisted(url):
+                    continue
+                if domain_of(url) != base_domain:
+                    continue
+
+                # ------------------------------------------------------------
+                # PATCH WPDM — tratar como arquivo direto
+                # ------------------------------------------------------------
+                if "wpdmdl=" in url.lower():
+                    print(f"[DISCOVERY] Visitando {url} (profundidade {depth})")
+                    add_found(url)
+                    continue
+
+                # ------------------------------------------------------------
+                # Skip manual
+                # ------------------------------------------------------------
+                if skip_current_url:
+                    skip_current_url = False
+                    continue
+
+                batch.append((url, depth))
 
             # ------------------------------------------------------------
-            # Skip manual
+            # HTML estático — GET + extração do lote inteiro em paralelo
             # ------------------------------------------------------------
-            global skip_current_url
-            if skip_current_url:
-                skip_current_url = False
-                continue
-
-            lower_url = url.lower()
+            fetched = fetch_batch_parallel([u for u, _ in batch])
 
             # ------------------------------------------------------------
-            # Detector universal de página de detalhe (?id=)
+            # Selenium — renders do lote em paralelo (um Chrome por página)
+            #   promissora sem docs estáticos → fallback completo
+            #   sem HTML estático → só render para achar links internos
             # ------------------------------------------------------------
-            if "id=" in lower_url and "cat=" not in lower_url:
-                parsed_path = urlparse(url).path
-                if not any(parsed_path.lower().endswith(ext) for ext in DOC_EXTS):
-                    m = re.search(r"id=(\d+)", lower_url)
-                    if m:
-                        special = f"detail://{url}|{m.group(1)}"
-                        if special not in all_found_files:
-                            all_found_files.append(special)
+            dyn_futures = {}
+            if selenium_pool:
+                for url, _ in batch:
+                    html, static_docs, _ = fetched.get(url, ("", [], []))
+                    promising = not static_docs and any(
+                        k in url.lower()
+                        for k in ["ata", "reuni", "comit", "invest", "politica", "política"]
+                    )
+                    if promising or not html:
+                        dyn_futures[url] = selenium_pool.submit(
+                            selenium_process_url, url, promising
+                        )
 
-            # ------------------------------------------------------------
-            # HTML estático
-            # ------------------------------------------------------------
-            resp = safe_get(url)
-            html = resp.text if resp else ""
+            for url, depth in batch:
 
-            # ------------------------------------------------------------
-            # PATCH CAT ID
-            # ------------------------------------------------------------
-            if "downloads.php?cat=" in lower_url and html:
-                for a in BeautifulSoup(html, "lxml").find_all("a", href=True):
-                    href = a["href"].strip()
-                    if "id=" in href:
-                        abs_url = urljoin(url, href)
-                        m = re.search(r"id=(\d+)", abs_url)
+                print(f"[DISCOVERY] Visitando {url} (profundidade {depth})")
+
+                lower_url = url.lower()
+                html, static_docs, internal_scored = fetched.get(url, ("", [], []))
+
+                # ------------------------------------------------------------
+                # Detector universal de página de detalhe (?id=)
+                # ------------------------------------------------------------
+                if "id=" in lower_url and "cat=" not in lower_url:
+                    parsed_path = parse_url(url).path
+                    if not parsed_path.lower().endswith(DOC_EXTS):
+                        m = _ID_PARAM_RE.search(lower_url)
                         if m:
-                            special = f"detail://{abs_url}|{m.group(1)}"
-                            if special not in all_found_files:
-                                all_found_files.append(special)
+                            special = f"detail://{url}|{m.group(1)}"
+                            add_found(special)
+
+                # ------------------------------------------------------------
+                # PATCH CAT ID
+                # ------------------------------------------------------------
+                if "downloads.php?cat=" in lower_url and html:
+                    for href, _ in extract_links(html)[0]:
+                        href = href.strip()
+                        if "id=" in href:
+                            abs_url = urljoin(url, href)
+                            m = _ID_PARAM_RE.search(abs_url)
+                            if m:
+                                special = f"detail://{abs_url}|{m.group(1)}"
+                                add_found(special)
+
+                # ------------------------------------------------------------
+                # Documentos encontrados no HTML
+                # ------------------------------------------------------------
+                for d in static_docs:
+                    add_found(d)
+
+                # ------------------------------------------------------------
+                # Selenium fallback genérico (resultado do render paralelo)
+                # ------------------------------------------------------------
+                html_dyn = None
+                if url in dyn_futures:
+                    try:
+                        html_dyn, dyn_docs = dyn_futures[url].result()
+                    except Exception as e:
+                        print(f"[SELENIUM FAIL] {url}: {e}")
+                        dyn_docs = []
+                    for d in dyn_docs:
+                        add_found(d)
 
-            # ------------------------------------------------------------
-            # Documentos encontrados no HTML
-            # ------------------------------------------------------------
-            static_docs = extract_docs_from_html(url, html)
-            for d in static_docs:
-                if d not in all_found_files:
-                    all_found_files.append(d)
+                # ------------------------------------------------------------
+                # Fronteira — links internos (push com o score do link)
+                # ------------------------------------------------------------
+                if not html and selenium_ok:
+                    # reaproveita o render do fallback acima (mesma URL)
+                    internal_scored = extract_internal_links(url, html_dyn or "")
+
+                for score, next_url in internal_scored:
+                    if depth + 1 <= max_depth and canonicalize(next_url) not in visited:
+                        heapq.heappush(
+                            frontier, (-score, depth + 1, next(order), next_url)
+                        )
 
             # ------------------------------------------------------------
-            # Selenium fallback genérico
+            # Checkpoint do lote (uma transação)
             # ------------------------------------------------------------
-            looks_promising = any(
-                k in lower_url
-                for k in ["ata", "reuni", "comit", "invest", "politica", "política"]
-            )
-
-            if driver and looks_promising and not static_docs:
+            if state_conn:
                 try:
-                    selenium_force_click_tabs(driver)
-                    selenium_force_select_years(driver)
-                    selenium_force_scroll_and_paginate(driver)
-                except Exception:
-                    pass
-
-                html_dyn = selenium_render_and_get_html(driver, url)
-                if html_dyn:
-                    dyn_docs = extract_docs_from_html(url, html_dyn)
-                    dyn_docs.extend(
-                        selenium_click_promising_and_collect(driver, url)
+                    save_batch(
+                        state_conn,
+                        base_url,
+                        batch_visited,
+                        [(u, d, -neg) for neg, d, _, u in frontier],
+                        all_found_files[found_before:],
                     )
-                    for d in dyn_docs:
-                        if d not in all_found_files:
-                            all_found_files.append(d)
-
-            # ------------------------------------------------------------
-            # BFS — links internos
-            # ------------------------------------------------------------
-            html_for_links = html or ""
-            if not html_for_links and driver:
-                html_for_links = selenium_render_and_get_html(driver, url) or ""
-
-            internal_scored = extract_internal_links(url, html_for_links)
-
-            for _, next_url in internal_scored:
-                if next_url not in visited and depth + 1 <= max_depth:
-                    queue.append((next_url, depth + 1))
+                except Exception as e:
+                    print(f"[DISCOVERY][STATE][ERRO] {e}")
 
         # ============================================================
         # SITEMAP FALLBACK — tentativa única, sem recursão
@@ -958,53 +1353,63 @@ def crawl_site(base_url: str, max_depth: int = MAX_CRAWL_DEPTH):
                         f"[SITEMAP] {len(filtered)} URLs relevantes encontradas — processando"
                     )
 
+                    # mesmo critério dos links internos: sem texto de âncora,
+                    # só a URL pontua (+ bônus de hub)
                     for url in filtered:
-                        if url not in visited:
-                            queue.append((url, 1))
-
-                    while queue and len(visited) < MAX_PAGES_FROM_SITE:
-
-                        url, depth = queue.popleft()
-
-                        if url in visited:
-                            continue
-                        visited.add(url)
-
-                        if depth > max_depth:
-                            continue
-                        if url_blacklisted(url):
-                            continue
-                        if domain_of(url) != base_domain:
-                            continue
-
-                        print(f"[DISCOVERY][SITEMAP] Visitando {url}")
-
-                        resp = safe_get(url)
-                        html = resp.text if resp else ""
-
-                        docs = extract_docs_from_html(url, html)
-                        for d in docs:
-                            if d not in all_found_files:
-                                all_found_files.append(d)
+                        if canonicalize(url) not in visited:
+                            score = element_text_score("", url)
+                            if is_download_hub_candidate(url):
+                                score += 30
+                            heapq.heappush(frontier, (-score, 1, next(order), url))
+
+                    while frontier and len(visited) < MAX_PAGES_FROM_SITE:
+
+                        # mesmo esquema do loop principal: lote em paralelo
+                        batch = []
+                        while (
+                            frontier
+                            and len(batch) < FETCH_WORKERS
+                            and len(visited) < MAX_PAGES_FROM_SITE
+                        ):
+                            _, depth, _, url = heapq.heappop(frontier)
+
+                            key = canonicalize(url)
+                            if key in visited:
+                                continue
+                            visited.add(key)
+
+                            if depth > max_depth:
+                                continue
+                            if url_blacklisted(url):
+                                continue
+                            if domain_of(url) != base_domain:
+                                continue
+
+                            batch.append(url)
+
+                        fetched = fetch_batch_parallel(batch)
+
+                        for url in batch:
+                            print(f"[DISCOVERY][SITEMAP] Visitando {url}")
+
+                            _, docs, _ = fetched.get(url, ("", [], []))
+                            for d in docs:
+                                add_found(d)
 
             except Exception as e:
                 print(f"[SITEMAP][ERRO] {e}")
 
     finally:
-        if driver:
-            try:
-                driver.quit()
-            except Exception:
-                pass
+        if selenium_pool:
+            selenium_pool.shutdown(wait=True)
 
-    # ------------------------------------------------------------
-    # DEDUPE FINAL
-    # ------------------------------------------------------------
-    seen = set()
-    final = []
-    for u in all_found_files:
-        if u not in seen:
-            seen.add(u)
-            final.append(u)
+    # crawl concluído → descarta o estado salvo do site
+    if state_conn:
+        try:
+            clear_state(state_conn, base_url)
+        except Exception as e:
+            print(f"[DISCOVERY][STATE][ERRO] {e}")
+        state_conn.close()
 
-    return final
+    # já sem duplicatas: add_found só anexa o que ainda não está em found_set
+    return all_found_files
@@ -6,24 +6,30 @@ Robust downloader para o projeto RPPS.
   download_single_url, download_detail_page).
 - Não usa asyncio (evita problemas de event loop no Windows).
 - Usa ThreadPoolExecutor com limites por domínio para evitar overloading.
-- Session por thread para reaproveitar conexões.
+- Session única com pool de conexões para reaproveitar keep-alive.
 - Seen-hashes protegido por lock.
 """
 
+import os
 import time
 import random
 import hashlib
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse, unquote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from urllib.parse import urljoin, unquote
 from pathlib import Path
 from tqdm import tqdm
+from .utils import parse_url, unquote_cached
 import unicodedata
 import re
 import urllib3
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 import math
 import json
 
@@ -35,11 +41,22 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 REQUEST_TIMEOUT = 10
 REQUEST_RETRIES = 2
 REQUEST_BACKOFF = (1.0, 2.0)  # multiplicative backoff factor between retries
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)  # refeitos pelo urllib3 (GET/HEAD)
+RETRY_AFTER_MAX = 10.0    # teto (s) do Retry-After respeitado no retry por status
 MAX_HTML_HOPS = 2
 DOC_EXTS = (".pdf", ".doc", ".docx", ".htm", ".html", ".xlsx", ".xls")
+_DOC_EXT_SET = frozenset(DOC_EXTS)
 DOMAIN_LIMIT = 2          # conexões simultâneas por domínio
 GLOBAL_CONCURRENCY = 40   # número MAX de downloads concorrentes no pool
 HEAD_TIMEOUT = 10
+HEAD_RETRIES = 1          # HEAD é só sondagem: falhou, o link fica de fora
+PROBE_RANGE_HEADER = {"Range": "bytes=0-0"}  # sonda de Content-Type: GET de 1 byte
+DOWNLOAD_WORKERS = 12     # threads do download_files
+HEAD_CACHE_SIZE = 4096    # URLs com Content-Type já resolvido via HEAD
+HEAD_NEG_TTL = 300        # segundos que uma sonda que falhou fica em cache
+HEAD_WORKERS = 16         # HEADs simultâneos por página em extract_document_links
+DOWNLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB por chunk no streaming (menos read/write por arquivo)
+NORMALIZE_CACHE_SIZE = 16384  # nomes já normalizados (NFKD) mantidos em cache
 
 # ----------------------------------------------------------------------
 # User Agents diversos para reduzir chance de bloqueio por bot
@@ -69,25 +86,65 @@ FILENAME_BLACKLIST = [
     "gabarito", "resultado", "classificacao", "convocacao",
     "estudo", "atuarial", "governanca",
 ]
+# padrões compilados uma vez (normalize_text roda por nome de arquivo)
+_WS_RE = re.compile(r"\s+")
+_JS_DOC_URL_RE = re.compile(r'["\'](https?://[^"\']+\.(?:pdf|docx?|xlsx?|html?))["\']', re.IGNORECASE)
+_CD_FILENAME_RE = re.compile(r'filename\*?=([^;]+)', re.IGNORECASE)
+# tudo que não é alfanumérico (Unicode, como str.isalnum), espaço, ".", "_" ou "-"
+_UNSAFE_FILENAME_RE = re.compile(r"[^\w .\-]")
+_PDF_URL_RE = re.compile(r'https?://[^"\']+\.pdf', re.I)
+# mesmo recorte do antigo href=["']...?wpdmdl=N, aplicado ao href já extraído
+_WPDM_HREF_RE = re.compile(r'[^"\']+\?wpdmdl=\d+', re.I)
+_ONCLICK_DOWNLOAD_RE = re.compile(r"['\"]([^'\"]*download[^'\"]*)['\"]", re.I)
+_JS_LOCATION_RE = re.compile(r"location\s*=\s*['\"]([^'\"]+)['\"]", re.I)
+# texto de âncora que já basta pra virar candidato (ata, reunião, comitê)
+_CANDIDATE_TEXT_RE = re.compile("ata|reuni|comit", re.I)
+# dicas de que um link sem extensão ainda pode entregar um arquivo
+HEAD_HINT_TERMS = ("download", "baixar", "arquivo", "documento", "anexo", "visualizar")
+_HEAD_HINT_RE = re.compile("|".join(HEAD_HINT_TERMS), re.I)
+_JS_DOWNLOAD_URL_RE = re.compile(r"https?://[^\"']+(?:download|baixar)[^\"']*", re.I)
+# query de navegação (categoria, paginação, filtro de ano/mês) → listagem, não arquivo
+NAV_QUERY_KEYS = ("cat", "y", "m", "page", "p")
+# Content-Types que indicam arquivo de verdade na resposta dos POSTs de detalhe
+BINARY_CONTENT_TYPES = ("pdf", "octet-stream", "binary", "msword", "officedocument")
+SOCIAL_HOSTS = frozenset((
+    "facebook.com", "instagram.com", "twitter.com", "x.com", "linkedin.com", "whatsapp.com",
+    "wa.me",
+))
+# endpoints testados em paralelo no download_detail_page; todos no mesmo host,
+# então não passa do limite por domínio (portais pequenos bloqueiam rajadas).
+# Quem já segura um slot do semáforo do domínio (_process_one) varre com 1
+DETAIL_PROBE_WORKERS = DOMAIN_LIMIT
+_NAV_QUERY_RE = re.compile(r"(?:^|&)(?:" + "|".join(NAV_QUERY_KEYS) + r")=", re.I)
+
+# fallback BS4 do extract_form_actions: só os <form> viram nós
+_FORM_STRAINER = SoupStrainer("form")
 
 # -------------------------
 # Utilitários e helpers
 # -------------------------
+# mesmos nomes/textos de link se repetem entre páginas e sites; NFKD é caro
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_text(s: str) -> str:
     s = unicodedata.normalize("NFKD", s).encode("ASCII", "ignore").decode()
     s = s.lower().replace("-", " ")
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _WS_RE.sub(" ", s).strip()
     return s
 
+# termos normalizados uma vez, do mesmo jeito que o nome testado ("prova-de-vida"
+# vira "prova de vida"; cru, com hífen, nunca casava), numa alternação só
+FILENAME_BLACKLIST_NORMALIZED = tuple(dict.fromkeys(normalize_text(t) for t in FILENAME_BLACKLIST))
+_FILENAME_BLACKLIST_RE = re.compile("|".join(map(re.escape, FILENAME_BLACKLIST_NORMALIZED)))
+
+# chamada por âncora no discovery com os mesmos nomes/textos de novo e de
+# novo: o cache pula também o search na alternação
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def is_probably_meeting_document(text_to_check: str) -> bool:
     """
     Reaproveitada pelo discovery; deve existir para import.
     """
     normalized_name = normalize_text(text_to_check or "")
-    for term in FILENAME_BLACKLIST:
-        if term in normalized_name:
-            return False
-    return True
+    return _FILENAME_BLACKLIST_RE.search(normalized_name) is None
 
 def get_headers(referer: str | None = None) -> dict:
     h = {
@@ -99,9 +156,6 @@ def get_headers(referer: str | None = None) -> dict:
         h["Referer"] = referer
     return h
 
-def sha1_bytes(b: bytes) -> str:
-    return hashlib.sha1(b).hexdigest()
-
 def safe_sleep_backoff(attempt: int):
     # jitter + exponential-ish backoff
     base = REQUEST_BACKOFF[0]
@@ -110,46 +164,91 @@ def safe_sleep_backoff(attempt: int):
     time.sleep(wait)
 
 # -------------------------
-# Thread-local session
+# Session compartilhada
 # -------------------------
-_thread_local = threading.local()
+# Uma Session só, com pool de conexões keep-alive por host. A Session por
+# thread morria junto com as threads de cada ThreadPoolExecutor (um pool por
+# chamada), então o handshake TCP+TLS era refeito a cada lote.
+# Retries por status (429/5xx) ficam no urllib3: reaproveitam a conexão e
+# respeitam Retry-After. Falhas de rede continuam no loop do robust_request.
+_SESSION = requests.Session()
+# sem verify na Session: com trust_env o REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE do
+# ambiente o sobrescreveria — verify=False vai em cada request
+
+
+class _CappedRetry(Retry):
+    """
+    Retry que respeita o Retry-After, mas no máximo RETRY_AFTER_MAX segundos:
+    um 429/503 com "Retry-After: 3600" prendia a thread de download por 1h.
+    """
+
+    def parse_retry_after(self, retry_after):
+        return min(super().parse_retry_after(retry_after), RETRY_AFTER_MAX)
+
+
+_status_retry = _CappedRetry(
+    total=REQUEST_RETRIES,
+    connect=0,
+    read=0,
+    status=REQUEST_RETRIES,
+    backoff_factor=REQUEST_BACKOFF[0],
+    status_forcelist=RETRY_STATUS_CODES,
+    allowed_methods=frozenset(("GET", "HEAD")),
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+_http_adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=_status_retry)
+_SESSION.mount("http://", _http_adapter)
+_SESSION.mount("https://", _http_adapter)
 
 def get_session():
     """
-    Cada thread tem sua requests.Session() para reaproveitar conexões.
+    Session compartilhada do downloader (mantida por compatibilidade).
     """
-    if not hasattr(_thread_local, "session"):
-        s = requests.Session()
-        s.verify = False
-        _thread_local.session = s
-    return _thread_local.session
+    return _SESSION
 
 # -------------------------
 # Robust request (sync)
 # -------------------------
 def robust_request(method: str, url: str, referer: str | None = None,
                    retries: int = REQUEST_RETRIES, timeout: int = REQUEST_TIMEOUT,
-                   stream: bool = False, data: dict | None = None):
+                   stream: bool = False, data: dict | None = None,
+                   raise_for_status: bool = True, allow_redirects: bool = True,
+                   headers_extra: dict | None = None):
     last_err = None
     session = get_session()
     for attempt in range(retries):
+        headers = get_headers(referer=referer)
+        if headers_extra:
+            headers.update(headers_extra)
         try:
             resp = session.request(
                 method,
                 url,
-                headers=get_headers(referer=referer),
+                headers=headers,
                 timeout=timeout,
-                allow_redirects=True,
+                allow_redirects=allow_redirects,
                 stream=stream,
-                data=data
+                data=data,
+                verify=False,
             )
-            resp.raise_for_status()
+            if raise_for_status:
+                resp.raise_for_status()
             return resp
+        except requests.HTTPError as e:
+            # status de erro: 429/5xx já foram refeitos no adapter e 4xx não
+            # muda repetindo → sem novo loop/backoff aqui
+            resp.close()
+            last_err = e
+            print(f"Erro {method} {url}: {e}")
+            break
         except Exception as e:
             last_err = e
             # print debug line for diagnostics (keeps previous behavior)
             print(f"Erro {method} {url} (tentativa {attempt+1}/{retries}): {e}")
-            safe_sleep_backoff(attempt)
+            # sem sleep depois da última tentativa (só atrasava o retorno)
+            if attempt + 1 < retries:
+                safe_sleep_backoff(attempt)
     print(f"Falha em {method} {url}: {last_err}")
     return None
 
@@ -159,88 +258,181 @@ def robust_request(method: str, url: str, referer: str | None = None,
 def looks_like_doc_url(href: str) -> bool:
     if not href:
         return False
-    href_l = href.lower()
-    return any(href_l.split("?", 1)[0].endswith(ext) for ext in DOC_EXTS)
-
-def extract_candidate_doc_urls_from_html(page_url: str, html: str) -> list[str]:
+    # extensão depois do último ponto → uma busca no set (todas as DOC_EXTS
+    # começam com "." e não têm outro ponto, então equivale ao endswith)
+    path = href.lower().partition("?")[0]
+    dot = path.rfind(".")
+    return dot != -1 and path[dot:] in _DOC_EXT_SET
+
+def extract_candidate_doc_urls_from_html(page_url: str, html: str, links=None) -> list[str]:
+    # links = extract_links(html) do discovery, quando quem chama já extraiu
     if not html:
         return []
 
-    soup = BeautifulSoup(html, "lxml")
+    if links is None:
+        # ⚠️ import local para evitar import circular
+        from .page_parser import extract_links
+        links = extract_links(html)
+    anchors, embeds = links
     candidates: list[str] = []
 
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
+    for href, text in anchors:
+        href = href.strip()
         abs_url = urljoin(page_url, href)
-        txt = (a.get_text(strip=True) or "").lower()
-
-        if looks_like_doc_url(href) or "ata" in txt or "reuni" in txt or "comit" in txt:
+        if looks_like_doc_url(href) or _CANDIDATE_TEXT_RE.search(text):
             candidates.append(abs_url)
 
-    for tag in soup.find_all(["iframe", "embed", "object"]):
-        src = tag.get("src") or tag.get("data")
+    for src in embeds:
         if not src:
             continue
         abs_url = urljoin(page_url, src)
         if looks_like_doc_url(abs_url):
             candidates.append(abs_url)
 
-    for m in re.findall(r'["\'](https?://[^"\']+\.(?:pdf|docx?|xlsx?|html?))["\']', html, flags=re.IGNORECASE):
+    for m in _JS_DOC_URL_RE.findall(html):
         candidates.append(m)
 
-    seen = set()
-    out = []
-    for u in candidates:
-        if u not in seen:
-            out.append(u)
-            seen.add(u)
-    return out
+    # dedupe mantendo a ordem
+    return list(dict.fromkeys(candidates))
+
+# pool fixo de threads para os HEADs (não recria threads a cada página)
+_HEAD_POOL = ThreadPoolExecutor(max_workers=HEAD_WORKERS)
+
+_head_cache = OrderedDict()   # url -> (expira_em ou None, content-type ou None)
+_head_cache_lock = threading.Lock()
+
+
+def head_content_type(url: str, referer: str | None = None) -> str | None:
+    """
+    Content-Type (minúsculo) do link, memoizado por URL (LRU, HEAD_CACHE_SIZE).
+    Menus/rodapés repetem os mesmos links em todas as páginas; sem o cache
+    cada página refazia a sonda. Referer não entra na chave.
+    None = sonda falhou; fica em cache só por HEAD_NEG_TTL segundos (timeout
+    ou 503 passageiro não derruba o link pelo resto da execução).
+
+    A sonda é um GET com Range: bytes=0-0 em streaming, não HEAD: vários
+    servidores respondem HEAD com 405 ou text/html mesmo entregando PDF no
+    GET. O corpo nunca é lido (close logo após os headers).
+    """
+    with _head_cache_lock:
+        entry = _head_cache.get(url)
+        if entry is not None:
+            if entry[0] is None or entry[0] > time.time():
+                _head_cache.move_to_end(url)
+                return entry[1]
+            del _head_cache[url]
+
+    probe = robust_request("GET", url, referer=referer,
+                           retries=HEAD_RETRIES, timeout=HEAD_TIMEOUT,
+                           stream=True, headers_extra=PROBE_RANGE_HEADER)
+    ctype = None
+    if probe:
+        ctype = (probe.headers.get("Content-Type") or "").lower()
+        probe.close()
+
+    expires = None if ctype is not None else time.time() + HEAD_NEG_TTL
+    with _head_cache_lock:
+        _head_cache[url] = (expires, ctype)
+        _head_cache.move_to_end(url)
+        if len(_head_cache) > HEAD_CACHE_SIZE:
+            _head_cache.popitem(last=False)
+    return ctype
+
+
+def is_social_url(url: str) -> bool:
+    """
+    Link de rede social (host ou subdomínio de SOCIAL_HOSTS). Compara o host,
+    não substring: "x.com" não pega mais "linux.com" nem ".../x.com/...".
+    """
+    host = parse_url(url).hostname or ""
+    # o próprio host e cada sufixo (www.facebook.com → facebook.com → com)
+    while host:
+        if host in SOCIAL_HOSTS:
+            return True
+        host = host.partition(".")[2]
+    return False
+
+
+def worth_head_probe(abs_url: str, page_host: str) -> bool:
+    """
+    Filtro barato antes do HEAD: só http(s) do próprio host e sem query de
+    navegação. mailto:/javascript:/tel:, links externos e paginação nunca
+    entregavam documento e custavam um RTT cada.
+    """
+    parsed = parse_url(abs_url)
+    if parsed.scheme not in ("http", "https"):
+        return False
+    if parsed.netloc != page_host:
+        return False
+    return not _NAV_QUERY_RE.search(parsed.query)
+
 
 def extract_document_links(page_url: str) -> list[str]:
     resp = robust_request("GET", page_url)
     if not resp:
         return []
 
+    # ⚠️ import local para evitar import circular
+    from .page_parser import extract_links
+
     html = resp.text
-    soup = BeautifulSoup(html, "lxml")
+    # uma passada lxml (âncoras + embeds) serve às duas etapas abaixo
+    links = extract_links(html)
     found_links: list[str] = []
 
-    found_links.extend(extract_candidate_doc_urls_from_html(page_url, html))
-
-    for a in soup.find_all("a", href=True):
-        href = a["href"].strip()
+    found_links.extend(extract_candidate_doc_urls_from_html(page_url, html, links))
+    # o que a passada de candidatos já achou (extensão, texto de ata, URL em JS)
+    # não precisa de HEAD
+    known = set(found_links)
+
+    # (url, precisa de HEAD?) na ordem da página; anchors sem extensão e sem
+    # nenhuma dica de download são navegação comum → nem HEAD nem resultado
+    anchors = []
+    page_host = parse_url(page_url).netloc
+    for href, text in links[0]:
+        href = href.strip()
         abs_url = urljoin(page_url, href)
-
         if looks_like_doc_url(href):
+            anchors.append((abs_url, False))
+        elif (
+            abs_url not in known
+            and worth_head_probe(abs_url, page_host)
+            and _HEAD_HINT_RE.search(text + " " + href)
+        ):
+            anchors.append((abs_url, True))
+
+    # HEADs do anchor loop em paralelo (antes: um RTT por vez)
+    to_head = list(dict.fromkeys(u for u, needs_head in anchors if needs_head))
+    ctypes = dict(zip(
+        to_head,
+        _HEAD_POOL.map(lambda u: head_content_type(u, referer=page_url), to_head),
+    ))
+
+    for abs_url, needs_head in anchors:
+        if not needs_head:
             found_links.append(abs_url)
             continue
 
-        head_resp = robust_request("HEAD", abs_url, referer=page_url, timeout=HEAD_TIMEOUT)
-        if not head_resp:
+        ctype = ctypes.get(abs_url)
+        if not ctype:
             continue
-        ctype = (head_resp.headers.get("Content-Type") or "").lower()
         if any(t in ctype for t in ["pdf", "msword", "officedocument", "html"]):
             found_links.append(abs_url)
 
-    seen = set()
-    out = []
-    for u in found_links:
-        if u not in seen:
-            out.append(u)
-            seen.add(u)
-    return out
+    # dedupe mantendo a ordem
+    return list(dict.fromkeys(found_links))
 
 # -------------------------
 # Filename / guessing
 # -------------------------
 def sanitize_filename(name: str) -> str:
-    return "".join(c for c in name if c.isalnum() or c in (" ", ".", "_", "-")).rstrip()
+    return _UNSAFE_FILENAME_RE.sub("", name).rstrip()
 
 def filename_from_content_disposition(cd: str | None) -> str | None:
     if not cd:
         return None
     # tenta extrair filename e filename*
-    m = re.search(r'filename\*?=([^;]+)', cd, flags=re.IGNORECASE)
+    m = _CD_FILENAME_RE.search(cd)
     if not m:
         return None
     value = m.group(1).strip().strip('"').strip("'")
@@ -252,9 +444,9 @@ def guess_filename(url: str, resp: requests.Response) -> str:
     if fn:
         return fn
 
-    path = urlparse(resp.url).path
+    path = parse_url(resp.url).path
     base = path.split("/")[-1]
-    base = unquote(base)
+    base = unquote_cached(base)
     base = sanitize_filename(base)
     if base:
         return base
@@ -268,6 +460,41 @@ def guess_filename(url: str, resp: requests.Response) -> str:
         return "pagina.html"
     return "arquivo.bin"
 
+# -------------------------
+# Form actions (download_detail_page)
+# -------------------------
+class _FormActionCollector:
+    """
+    Target do etree.HTMLParser: só guarda o action de cada <form>,
+    sem montar árvore (mesma ideia do _LinkCollector do discovery).
+    """
+    __slots__ = ("actions",)
+
+    def __init__(self):
+        self.actions = []
+
+    def start(self, tag, attrs):
+        if tag == "form":
+            self.actions.append(attrs.get("action"))
+
+    def end(self, tag):
+        pass
+
+    def data(self, text):
+        pass
+
+    def close(self):
+        return self.actions
+
+def extract_form_actions(html: str) -> list:
+    # cai no BS4 se o lxml recusar o HTML
+    try:
+        return etree.fromstring(html, etree.HTMLParser(target=_FormActionCollector()))
+    except (etree.LxmlError, ValueError):
+        pass
+    soup = BeautifulSoup(html, "lxml", parse_only=_FORM_STRAINER)
+    return [f.get("action") for f in soup.find_all("form")]
+
 # -------------------------
 # _download_binary_response
 # -------------------------
@@ -278,7 +505,7 @@ def _download_binary_response(resp: requests.Response,
                               seen_hashes: set,
                               seen_hashes_lock: threading.Lock):
     file_name = guess_filename(url, resp)
-    if not any(file_name.lower().endswith(ext) for ext in (".pdf", ".doc", ".docx", ".html", ".htm", ".xls", ".xlsx")):
+    if not file_name.lower().endswith(DOC_EXTS):
         ct = (resp.headers.get("Content-Type") or "").lower()
         if "pdf" in ct:
             file_name += ".pdf"
@@ -288,26 +515,51 @@ def _download_binary_response(resp: requests.Response,
             file_name += ".html"
 
     if not is_probably_meeting_document(file_name):
+        resp.close()
         return None
 
     dest = out_path / file_name
-    if dest.exists():
-        base, ext = dest.stem, dest.suffix
-        dest = out_path / f"{base}_{int(time.time())}{ext}"
 
-    content = resp.content
-    file_hash = sha1_bytes(content)
+    # streaming: hash incremental + escrita em arquivo temporário no mesmo
+    # passo, memória O(chunk) mesmo para PDFs grandes
+    tmp = out_path / f".{file_name}.{threading.get_ident()}.part"
+    # hash só para dedupe: usedforsecurity=False mantém o caminho OpenSSL
+    # (SHA-NI) liberado também em builds FIPS
+    h = hashlib.sha1(usedforsecurity=False)
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    h.update(chunk)
+                    f.write(chunk)
+    except Exception as e:
+        print(f"[ERR_WRITE] {dest}: {e}")
+        tmp.unlink(missing_ok=True)
+        return None
+    finally:
+        resp.close()
+
+    # digest cru (20 bytes) em vez do hexdigest: metade da memória por entrada
+    # e sem montar a string hex
+    file_hash = h.digest()
 
     with seen_hashes_lock:
         if file_hash in seen_hashes:
+            tmp.unlink(missing_ok=True)
             return None
         seen_hashes.add(file_hash)
 
-    try:
-        dest.write_bytes(content)
-    except Exception as e:
-        print(f"[ERR_WRITE] {dest}: {e}")
-        return None
+        # nome já usado por outro conteúdo → sufixo com o prefixo do hash
+        # (determinístico; o antigo sufixo de timestamp colidia entre threads
+        # no mesmo segundo). Checagem + rename sob o lock: sem corrida
+        if dest.exists():
+            dest = out_path / f"{dest.stem}_{file_hash.hex()[:12]}{dest.suffix}"
+        try:
+            os.replace(tmp, dest)
+        except Exception as e:
+            print(f"[ERR_WRITE] {dest}: {e}")
+            tmp.unlink(missing_ok=True)
+            return None
 
     return {
         "file_path": str(dest),
@@ -329,7 +581,7 @@ def download_single_url(doc_url: str, out_path: str, rpps_info, seen_hashes, see
         "GET",
         doc_url,
         referer=rpps_info.get("base_url"),
-        stream=False
+        stream=True
     )
 
     if not resp:
@@ -367,81 +619,58 @@ def download_single_url(doc_url: str, out_path: str, rpps_info, seen_hashes, see
     if "html" in ct or "<html" in html[:300].lower():
 
         # ⚠️ import local para evitar import circular
-        from .discovery import extract_docs_from_html
+        from .page_parser import extract_docs_from_html, extract_links
+
+        # candidatos em ordem de prioridade, url → aceita só pela extensão?
+        # (mesma URL vinda de mais de um patch = um GET só)
+        candidates: dict[str, bool] = {}
+
+        def add_candidate(u: str, by_ext: bool):
+            candidates[u] = candidates.get(u, False) or by_ext
 
         # -------------------------------------------
         # PATCH 1 — PDF embutido direto no HTML
         # -------------------------------------------
-        pdf_links = re.findall(
-            r'https?://[^"\']+\.pdf',
-            html,
-            flags=re.I
-        )
-
+        pdf_links = _PDF_URL_RE.findall(html)
         if pdf_links:
-            pdf_url = urljoin(doc_url, pdf_links[0])
-            sub = robust_request(
-                "GET",
-                pdf_url,
-                referer=doc_url,
-                stream=False
-            )
-            if sub:
-                sub_ct = (sub.headers.get("Content-Type") or "").lower()
-                if "pdf" in sub_ct:
-                    return _download_binary_response(
-                        sub, pdf_url, out_path, rpps_info,
-                        seen_hashes, seen_hashes_lock
-                    )
+            add_candidate(urljoin(doc_url, pdf_links[0]), False)
 
         # -------------------------------------------
         # PATCH 2 — WPDM dentro do HTML
         # -------------------------------------------
-        wpdmdl_links = re.findall(
-            r'href=["\']([^"\']+\?wpdmdl=\d+)',
-            html,
-            flags=re.I
-        )
-
-        for w in wpdmdl_links:
-            real = urljoin(doc_url, w)
-            sub = robust_request(
-                "GET",
-                real,
-                referer=doc_url,
-                stream=False
-            )
-            if sub:
-                sub_ct = (sub.headers.get("Content-Type") or "").lower()
-                if "pdf" in sub_ct:
-                    return _download_binary_response(
-                        sub, real, out_path, rpps_info,
-                        seen_hashes, seen_hashes_lock
-                    )
+        # uma passada lxml serve ao PATCH 2 e ao PATCH 3 (antes: regex de
+        # wpdmdl sobre o HTML inteiro + outro parse dentro do discovery)
+        links = extract_links(html)
+        for href, _ in links[0]:
+            m = _WPDM_HREF_RE.match(href)
+            if m:
+                add_candidate(urljoin(doc_url, m.group(0)), False)
 
         # -------------------------------------------
         # PATCH 3 — usar discovery para achar docs
         # -------------------------------------------
-        links = extract_docs_from_html(doc_url, html)
+        doc_links = extract_docs_from_html(doc_url, html, links)
+        if doc_links:
+            real_url = urljoin(doc_url, doc_links[0])
+            add_candidate(real_url, any(ext in real_url.lower() for ext in (".pdf", ".doc", ".docx")))
 
-        if links:
-            real_url = urljoin(doc_url, links[0])
+        # um laço só: primeiro binário encerra
+        for cand_url, by_ext in candidates.items():
             sub = robust_request(
                 "GET",
-                real_url,
+                cand_url,
                 referer=doc_url,
-                stream=False
+                stream=True
             )
-            if sub:
-                sub_ct = (sub.headers.get("Content-Type") or "").lower()
-                if (
-                    "pdf" in sub_ct
-                    or any(ext in real_url.lower() for ext in [".pdf", ".doc", ".docx"])
-                ):
-                    return _download_binary_response(
-                        sub, real_url, out_path, rpps_info,
-                        seen_hashes, seen_hashes_lock
-                    )
+            if not sub:
+                continue
+            sub_ct = (sub.headers.get("Content-Type") or "").lower()
+            if "pdf" in sub_ct or by_ext:
+                return _download_binary_response(
+                    sub, cand_url, out_path, rpps_info,
+                    seen_hashes, seen_hashes_lock
+                )
+            sub.close()
 
         print(f"[DOWNLOAD] Nenhum documento válido encontrado em {doc_url}")
         return None
@@ -450,6 +679,7 @@ def download_single_url(doc_url: str, out_path: str, rpps_info, seen_hashes, see
     # CASO FINAL — tipo desconhecido
     # ============================================================
     print(f"[DOWNLOAD] Tipo desconhecido em {doc_url} CT={ct}")
+    resp.close()
     return None
 
 # -------------------------
@@ -459,7 +689,8 @@ def download_detail_page(detail_url: str,
                          out_path: Path,
                          rpps_info: dict,
                          seen_hashes: set,
-                         seen_hashes_lock: threading.Lock):
+                         seen_hashes_lock: threading.Lock,
+                         probe_workers: int = DETAIL_PROBE_WORKERS):
     try:
         raw = detail_url.replace("detail://", "")
         page_url, file_id = raw.split("|", 1)
@@ -467,7 +698,7 @@ def download_detail_page(detail_url: str,
         print(f"[DOWNLOADER] detail:// inválido: {detail_url}")
         return None
 
-    parsed = urlparse(page_url)
+    parsed = parse_url(page_url)
     qs = parsed.query.lower()
     if f"id={file_id}" in qs:
         return download_single_url(page_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
@@ -476,26 +707,23 @@ def download_detail_page(detail_url: str,
     if not resp or not resp.text:
         return None
     html = resp.text
-    soup = BeautifulSoup(html, "lxml")
-
     candidates = set()
 
-    for f in soup.find_all("form"):
-        action = f.get("action")
+    for action in extract_form_actions(html):
         if action:
             candidates.add(urljoin(page_url, action))
 
-    onclicks = re.findall(r"['\"]([^'\"]*download[^'\"]*)['\"]", html, flags=re.I)
+    onclicks = _ONCLICK_DOWNLOAD_RE.findall(html)
     for oc in onclicks:
         if ".php" in oc:
             candidates.add(urljoin(page_url, oc))
 
-    locs = re.findall(r"location\s*=\s*['\"]([^'\"]+)['\"]", html, flags=re.I)
+    locs = _JS_LOCATION_RE.findall(html)
     for loc in locs:
         if ".php" in loc:
             candidates.add(urljoin(page_url, loc))
 
-    urls_js = re.findall(r"https?://[^\"']+(?:download|baixar)[^\"']*", html, flags=re.I)
+    urls_js = _JS_DOWNLOAD_URL_RE.findall(html)
     for u in urls_js:
         candidates.add(u)
 
@@ -515,9 +743,9 @@ def download_detail_page(detail_url: str,
         if not endpoint:
             continue
         ep = endpoint.strip()
-        if any(s in ep for s in ["facebook.com", "instagram.com", "twitter.com", "x.com", "linkedin.com", "whatsapp.com"]):
+        if is_social_url(ep):
             continue
-        parsed_ep = urlparse(ep)
+        parsed_ep = parse_url(ep)
         qs_ep = parsed_ep.query.lower()
         has_file_param = any(k in qs_ep for k in ["id=", "codigo=", "file=", "arquivo=", "doc="])
         if qs_ep and not has_file_param:
@@ -538,14 +766,94 @@ def download_detail_page(detail_url: str,
         {"acao": "download", "codigo": file_id},
     ]
 
-    for endpoint in candidates:
-        for payload in payload_variants:
-            resp_file = robust_request("POST", endpoint, referer=page_url, timeout=REQUEST_TIMEOUT, stream=False, data=payload)
-            if not resp_file:
-                continue
-            ct = (resp_file.headers.get("Content-Type") or "").lower()
-            if any(k in ct for k in ["pdf", "octet-stream", "binary", "msword", "officedocument"]):
-                return _download_binary_response(resp_file, endpoint, out_path, rpps_info, seen_hashes, seen_hashes_lock)
+    # varredura por endpoint, em paralelo até probe_workers (payloads em
+    # sequência dentro de cada um); o primeiro binário encontrado encerra o resto
+    claimed = threading.Event()
+    claim_lock = threading.Lock()
+
+    def claim():
+        with claim_lock:
+            if claimed.is_set():
+                return False
+            claimed.set()
+            return True
+
+    hit = None
+    workers = min(probe_workers, len(candidates))
+    if workers <= 1:
+        for ep in candidates:
+            hit = _probe_detail_endpoint(ep, page_url, payload_variants, claimed, claim)
+            if hit:
+                break
+    else:
+        ex = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [
+                ex.submit(_probe_detail_endpoint, ep, page_url, payload_variants, claimed, claim)
+                for ep in candidates
+            ]
+            for fut in as_completed(futures):
+                hit = fut.result()
+                if hit:
+                    break
+        finally:
+            # para os outros probes e espera os que estão no meio de um request
+            # (checam `claimed` entre payloads: no máximo um request cada) —
+            # nenhum POST sobra depois que o chamador solta o semáforo do domínio
+            claimed.set()
+            ex.shutdown(wait=True, cancel_futures=True)
+
+    if not hit:
+        return None
+    resp_file, file_url = hit
+    return _download_binary_response(resp_file, file_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
+
+def _probe_detail_endpoint(endpoint, page_url, payload_variants, claimed, claim):
+    """
+    Testa os payloads num endpoint de download; devolve (resp em streaming, url)
+    do primeiro binário, ou None. Só um probe ganha (claim); os outros fecham
+    a resposta e param assim que alguém ganhou.
+    """
+    for payload in payload_variants:
+        if claimed.is_set():
+            return None
+        # POST exploratório: sem seguir redirect e sem exceção por status —
+        # a maioria dos candidatos é 404/500 e só o status já basta
+        resp_file = robust_request(
+            "POST", endpoint, referer=page_url, retries=1, timeout=REQUEST_TIMEOUT,
+            stream=True, data=payload,
+            raise_for_status=False, allow_redirects=False,
+        )
+        if resp_file is None:
+            return None
+        status = resp_file.status_code
+        ct = (resp_file.headers.get("Content-Type") or "").lower()
+        if status < 300 and any(k in ct for k in BINARY_CONTENT_TYPES):
+            if claim():
+                return resp_file, endpoint
+            resp_file.close()
+            return None
+        resp_file.close()
+
+        # redirect: só segue se o destino tem cara de arquivo
+        if 300 <= status < 400:
+            loc = resp_file.headers.get("Location") or ""
+            if loc and (looks_like_doc_url(loc) or _HEAD_HINT_RE.search(loc)):
+                target = urljoin(endpoint, loc)
+                sub = robust_request("GET", target, referer=page_url, stream=True)
+                if sub:
+                    sub_ct = (sub.headers.get("Content-Type") or "").lower()
+                    if any(k in sub_ct for k in BINARY_CONTENT_TYPES) and claim():
+                        return sub, target
+                    sub.close()
+            continue
+
+        # endpoint inexistente/quebrado, ou que responde HTML sem anexo:
+        # outro payload não muda isso
+        if status >= 500 or status in (404, 405):
+            return None
+        if "html" in ct and not resp_file.headers.get("Content-Disposition"):
+            return None
 
     return None
 
@@ -565,57 +873,93 @@ def _get_domain_semaphore(domain: str):
         return _domain_locks[domain]
 
 def get_domain(url: str) -> str:
-    return urlparse(url).netloc
+    return parse_url(url).netloc
 
-def download_files(file_urls, out_dir, rpps_info=None):
+def _should_process(doc_url: str) -> bool:
     """
-    Comportamento síncrono original (itera sequencialmente).
+    Filtros baratos do download_files (redes sociais, páginas de navegação).
+    Rodam antes do submit: URL descartada não ocupa thread nem espera o
+    semáforo do domínio.
+    """
+    try:
+        if is_social_url(doc_url):
+            return False
+        if doc_url.startswith("detail://"):
+            return True
+        parsed = parse_url(doc_url)
+    except ValueError:
+        # URL malformada (ex.: "[" no host) → descarta só ela, não o lote
+        print(f"Erro ao processar {doc_url}: URL inválida")
+        return False
+    qs = parsed.query.lower()
+    if "id=" in qs or parsed.path.lower().endswith(DOC_EXTS):
+        return True
+    nav_tokens = ["cat=", "y=", "m=", "ano=", "mes=", "page=", "p="]
+    return not any(tok in qs for tok in nav_tokens)
+
+def _process_one(doc_url, out_path, rpps_info, seen_hashes, seen_hashes_lock):
+    """
+    Baixa uma URL do download_files já aprovada por _should_process. Roda nas
+    threads do pool; seen_hashes só é tocado sob seen_hashes_lock.
+    """
+    try:
+        # limite de conexões simultâneas por domínio (DOMAIN_LIMIT)
+        page_url = doc_url.replace("detail://", "").split("|", 1)[0]
+        with _get_domain_semaphore(get_domain(page_url)):
+            if doc_url.startswith("detail://"):
+                # já ocupa um slot do domínio: probes em sequência, sem threads extras
+                return download_detail_page(doc_url, out_path, rpps_info, seen_hashes,
+                                            seen_hashes_lock, probe_workers=1)
+            return download_single_url(doc_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
+    except Exception as e:
+        print(f"Erro ao processar {doc_url}: {e}")
+        return None
+
+def download_files(file_urls, out_dir, rpps_info=None, workers=DOWNLOAD_WORKERS):
+    """
+    Mesmo comportamento do download_files original, mas com as URLs
+    processadas em paralelo (ThreadPoolExecutor). Resultado na ordem da entrada.
     """
     out_path = Path(out_dir)
     out_path.mkdir(parents=True, exist_ok=True)
 
-    downloaded = []
-    seen_hashes: set = set()
+    seen_hashes: set[bytes] = set()  # sha1 .digest() dos arquivos já salvos
     seen_hashes_lock = threading.Lock()
 
     # Garantir lista para tqdm e para reuso
-    urls = list(file_urls)
-
-    for doc_url in tqdm(urls, desc="Baixando arquivos"):
-        try:
-            doc_url = str(doc_url)
-
-            # filtros genéricos
-            if any(s in doc_url for s in ["facebook.com", "instagram.com", "twitter.com", "x.com", "linkedin.com", "whatsapp.com"]):
-                continue
-
-            parsed = urlparse(doc_url)
-            path = parsed.path.lower()
-            qs = parsed.query.lower()
+    urls = [str(u) for u in file_urls]
+    results = [None] * len(urls)
 
-            if not doc_url.startswith("detail://") and "id=" in qs:
-                entry = download_single_url(doc_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
-                if entry:
-                    downloaded.append(entry)
-                continue
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = {
+            ex.submit(_process_one, u, out_path, rpps_info, seen_hashes, seen_hashes_lock): idx
+            for idx, u in enumerate(urls)
+            if _should_process(u)
+        }
+        for fut in tqdm(as_completed(futures), total=len(futures), desc="Baixando arquivos"):
+            results[futures[fut]] = fut.result()
 
-            if not doc_url.startswith("detail://"):
-                if not any(path.endswith(ext) for ext in DOC_EXTS):
-                    nav_tokens = ["cat=", "y=", "m=", "ano=", "mes=", "page=", "p="]
-                    if any(tok in qs for tok in nav_tokens):
-                        continue
-
-            if doc_url.startswith("detail://"):
-                entry = download_detail_page(doc_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
-            else:
-                entry = download_single_url(doc_url, out_path, rpps_info, seen_hashes, seen_hashes_lock)
+    return [entry for entry in results if entry]
 
-            if entry:
-                downloaded.append(entry)
-        except Exception as e:
-            print(f"Erro ao processar {doc_url}: {e}")
-
-    return downloaded
+def _header_keys(url: str, etag: str | None, clen: str | None, lastmod: str | None) -> list:
+    """
+    Chaves baratas de "mesma URL, arquivo inalterado" tiradas dos headers:
+    (host, path, query, ETag, tamanho) e (host, path, query, tamanho,
+    Last-Modified). ETag/Last-Modified só valem para o próprio recurso
+    (nginx/Apache montam a ETag de mtime+tamanho), então a URL inteira
+    entra na chave; dedupe entre URLs diferentes fica com o sha1.
+    Sem tamanho não há chave.
+    """
+    if not clen:
+        return []
+    parsed = parse_url(url)
+    resource = (parsed.netloc, parsed.path, parsed.query)
+    keys = []
+    if etag:
+        keys.append((*resource, "etag", etag, clen))
+    if lastmod:
+        keys.append((*resource, "lastmod", clen, lastmod))
+    return keys
 
 def download_files_parallel(links, out_path, rpps_info=None, workers=8):
     """
@@ -624,30 +968,63 @@ def download_files_parallel(links, out_path, rpps_info=None, workers=8):
     independentemente de nome ou URL.
     """
 
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    import json
-    import requests
-
     out_path.mkdir(parents=True, exist_ok=True)
 
     # ------------------------------------------------------------
     # HASH INDEX — carregar histórico persistente
     # ------------------------------------------------------------
-    hash_index_path = out_path / ".hash_index.json"
+    # um sha1 hex por linha, só acrescentado (nada é reescrito no fim)
+    hash_index_path = out_path / ".hash_index.txt"
+    legacy_index_path = out_path / ".hash_index.json"
 
-    if hash_index_path.exists():
-        try:
-            with open(hash_index_path, "r", encoding="utf-8") as f:
+    persisted_hashes = set()
+    try:
+        if hash_index_path.exists():
+            persisted_hashes = set(hash_index_path.read_text(encoding="utf-8").split())
+        elif legacy_index_path.exists():
+            # formato antigo {sha1: true} → migra uma vez para o .txt
+            with open(legacy_index_path, "r", encoding="utf-8") as f:
                 persisted_hashes = set(json.load(f).keys())
+            hash_index_path.write_text(
+                "".join(h + "\n" for h in persisted_hashes), encoding="utf-8"
+            )
+        if persisted_hashes:
             print(f"[HASH_INDEX] {len(persisted_hashes)} hashes carregados do histórico")
-        except Exception as e:
-            print(f"[HASH_INDEX][ERRO] Falha ao ler histórico: {e}")
-            persisted_hashes = set()
-    else:
+    except Exception as e:
+        print(f"[HASH_INDEX][ERRO] Falha ao ler histórico: {e}")
         persisted_hashes = set()
 
     # hashes já vistos (execuções anteriores + atual)
     seen_hashes = set(persisted_hashes)
+    seen_hashes_lock = threading.Lock()
+    # line-buffered: cada hash novo já vai pro disco (queda no meio não perde nada)
+    hash_index_fp = open(hash_index_path, "a", encoding="utf-8", buffering=1)
+
+    # ------------------------------------------------------------
+    # URL INDEX — validadores HTTP (ETag / Last-Modified) por URL
+    # ------------------------------------------------------------
+    # reexecução manda GET condicional; 304 = arquivo não mudou e nem o
+    # corpo nem o hash precisam ser refeitos
+    url_index_path = out_path / ".url_index.json"
+    url_index = {}
+    if url_index_path.exists():
+        try:
+            with open(url_index_path, "r", encoding="utf-8") as f:
+                url_index = json.load(f)
+        except Exception as e:
+            print(f"[URL_INDEX][ERRO] Falha ao ler histórico: {e}")
+    url_index_lock = threading.Lock()
+
+    # mesma URL vinda de páginas diferentes baixa uma vez só
+    links = list(dict.fromkeys(str(link) for link in links))
+
+    # chaves baratas de headers (_header_keys) dos arquivos já baixados, nesta
+    # execução e nas anteriores (via url_index): a mesma URL com os mesmos
+    # validadores é descartada sem ler o corpo, mesmo quando o servidor ignora
+    # o GET condicional e responde 200
+    seen_keys = set()
+    for u, meta in url_index.items():
+        seen_keys.update(_header_keys(u, meta.get("etag"), meta.get("length"), meta.get("last_modified")))
 
     downloaded_files = []
 
@@ -661,26 +1038,98 @@ def download_files_parallel(links, out_path, rpps_info=None, workers=8):
         url = str(entry)
 
         try:
-            resp = requests.get(url, timeout=20, verify=False)
-            if not resp.ok or not resp.content:
+            headers = get_headers()
+            validators = url_index.get(url) or {}
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+            # Session compartilhada (keep-alive)
+            resp = get_session().get(url, headers=headers, timeout=20, stream=True,
+                                     verify=False)
+            if resp.status_code == 304:
+                resp.close()
+                print(f"[SKIP][INALTERADO] {url}")
+                return None
+            if not resp.ok:
+                resp.close()
                 return None
 
-            content = resp.content
-            file_hash = sha1_bytes(content)
+            etag = resp.headers.get("ETag")
+            clen = resp.headers.get("Content-Length")
+            last_modified = resp.headers.get("Last-Modified")
+            cheap_keys = _header_keys(url, etag, clen, last_modified)
+            if cheap_keys:
+                with seen_hashes_lock:
+                    known = not seen_keys.isdisjoint(cheap_keys)
+                if known:
+                    resp.close()
+                    print(f"[SKIP][DUPLICADO] {url}")
+                    return None
+
+            # streaming: hash incremental + escrita num temporário no mesmo passo
+            # (memória O(chunk); o nome final só sai depois do hash)
+            tmp = out_path / f".download.{threading.get_ident()}.part"
+            h = hashlib.sha1(usedforsecurity=False)
+            size = 0
+            try:
+                with open(tmp, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            h.update(chunk)
+                            f.write(chunk)
+                            size += len(chunk)
+            except Exception:
+                tmp.unlink(missing_ok=True)
+                raise
+            finally:
+                resp.close()
+
+            if not size:
+                tmp.unlink(missing_ok=True)
+                return None
+
+            file_hash = h.hexdigest()
 
             # --- DEDUPE GLOBAL (inclui execuções passadas) ---
-            if file_hash in seen_hashes:
+            # o hash é reservado já aqui (outra thread com o mesmo conteúdo
+            # vira duplicado), mas só vai para os índices depois do os.replace
+            with seen_hashes_lock:
+                duplicate = file_hash in seen_hashes
+                if duplicate:
+                    seen_keys.update(cheap_keys)
+                else:
+                    seen_hashes.add(file_hash)
+            if duplicate:
+                tmp.unlink(missing_ok=True)
                 print(f"[SKIP][DUPLICADO] {url}")
                 return None
 
-            seen_hashes.add(file_hash)
-
             # nome seguro baseado no hash
             filename = f"doc_{file_hash[:12]}.pdf"
             file_path = out_path / filename
 
-            with open(file_path, "wb") as f:
-                f.write(content)
+            try:
+                os.replace(tmp, file_path)
+            except Exception:
+                tmp.unlink(missing_ok=True)
+                with seen_hashes_lock:
+                    seen_hashes.discard(file_hash)
+                raise
+
+            # arquivo no lugar: agora sim registra hash, chaves e validadores
+            with seen_hashes_lock:
+                hash_index_fp.write(file_hash + "\n")
+                seen_keys.update(cheap_keys)
+            if etag or last_modified:
+                with url_index_lock:
+                    url_index[url] = {
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "length": clen,
+                        "sha1": file_hash,
+                    }
 
             return {
                 "file_path": str(file_path),
@@ -696,28 +1145,24 @@ def download_files_parallel(links, out_path, rpps_info=None, workers=8):
     # ------------------------------------------------------------
     # Execução paralela
     # ------------------------------------------------------------
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(download_one, link) for link in links]
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(download_one, link) for link in links]
 
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                downloaded_files.append(result)
+            for future in as_completed(futures):
+                result = future.result()
+                if result:
+                    downloaded_files.append(result)
+    finally:
+        hash_index_fp.close()
+
+    print(f"[HASH_INDEX] Histórico atualizado ({len(seen_hashes)} hashes)")
 
-    # ------------------------------------------------------------
-    # Persistir HASH INDEX atualizado
-    # ------------------------------------------------------------
     try:
-        with open(hash_index_path, "w", encoding="utf-8") as f:
-            json.dump(
-                {h: True for h in seen_hashes},
-                f,
-                ensure_ascii=False,
-                indent=2
-            )
-        print(f"[HASH_INDEX] Histórico atualizado ({len(seen_hashes)} hashes)")
+        with open(url_index_path, "w", encoding="utf-8") as f:
+            json.dump(url_index, f, ensure_ascii=False)
     except Exception as e:
-        print(f"[HASH_INDEX][ERRO] Falha ao salvar histórico: {e}")
+        print(f"[URL_INDEX][ERRO] Falha ao salvar histórico: {e}")
 
     return downloaded_files
 
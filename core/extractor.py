@@ -3,15 +3,20 @@ Extrator de texto e metadados das atas baixadas
 Patchado para ignorar arquivos DOC/DOCX corrompidos ou HTML disfarçado.
 """
 
+from contextlib import closing
+from itertools import islice
 from pathlib import Path
+import hashlib
 import re
 import pdfplumber
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
 import docx
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 import mammoth
 import logging
 import zipfile
-import io
 
 logging.getLogger("pdfminer").setLevel(logging.ERROR)
 logging.getLogger("pdfplumber").setLevel(logging.ERROR)
@@ -26,14 +31,91 @@ DATE_PATTERNS = [
     r"\b\d{1,2}/\d{1,2}/\d{4}\b",
     r"\b\d{1,2}\s+de\s+[a-zç]+\s+de\s+\d{4}\b"
 ]
+# uma alternação só: o trecho é varrido uma vez (e não uma por padrão)
+_DATE_RE = re.compile("|".join(f"(?:{p})" for p in DATE_PATTERNS), re.IGNORECASE)
+_COMITE_RE = re.compile("|".join(map(re.escape, KEYWORDS_COMITE)), re.IGNORECASE)
+_CONSELHO_RE = re.compile("|".join(map(re.escape, KEYWORDS_CONSELHO)), re.IGNORECASE)
+
+# página com menos texto que isso + imagem = digitalizada (ata escaneada)
+SCANNED_MIN_CHARS = 20
+CONTENT_KEY_BYTES = 1 << 20  # prefixo lido para a chave de conteúdo (1 MiB)
+ZIP_MAGIC = b"PK\x03\x04"    # assinatura de DOCX (zip) no começo do arquivo
 
 # -------------------------------------------------------------------
 # PDF
 # -------------------------------------------------------------------
-def extract_text_from_pdf(file_path):
+# pdfium (C++) em vez do pdfminer em Python puro: só precisamos do texto
+# corrido, sem layout de tabela → bem mais rápido e com menos memória
+def _pdf_page_text(pdf, index):
+    page = pdf[index]
+    try:
+        textpage = page.get_textpage()
+        text = textpage.get_text_bounded().replace("\r\n", "\n")
+        textpage.close()
+        return text
+    finally:
+        page.close()
+
+def _pdf_page_has_images(pdf, index):
+    page = pdf[index]
+    try:
+        return any(True for _ in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_IMAGE,)))
+    finally:
+        page.close()
+
+def iter_pdf_text(file_path):
+    """
+    Texto de cada página, em ordem, sob demanda (quem só precisa do começo
+    para de iterar e o resto nem é lido). PDF escaneado não rende nada.
+    """
+    pdf = pdfium.PdfDocument(str(file_path))
+    try:
+        n_pages = len(pdf)
+        if not n_pages:
+            return
+        # pré-checagem: primeira e página do meio sem texto mas com imagem
+        # → PDF escaneado; não adianta percorrer o resto (fica pra IA/OCR).
+        # a do meio só é lida se a primeira já parecer escaneada
+        # (com uma página só, a do meio é a própria primeira: não relê)
+        probed = {0: _pdf_page_text(pdf, 0)}
+        scanned = len(probed[0].strip()) < SCANNED_MIN_CHARS and _pdf_page_has_images(pdf, 0)
+        if scanned and n_pages > 1:
+            mid = n_pages // 2
+            probed[mid] = _pdf_page_text(pdf, mid)
+            scanned = len(probed[mid].strip()) < SCANNED_MIN_CHARS and _pdf_page_has_images(pdf, mid)
+        if scanned:
+            print(f"[SKIP] PDF escaneado (sem texto) → {file_path}")
+            return
+
+        for i in range(n_pages):
+            yield probed[i] if i in probed else _pdf_page_text(pdf, i)
+    finally:
+        pdf.close()
+
+def extract_text_from_pdf(file_path, max_chars=None, max_pages=None):
+    # max_chars: para de ler páginas assim que o texto acumulado chega lá
+    # (detect_meeting_type / extract_meeting_date só olham os 500 primeiros)
+    # max_pages: teto de páginas lidas (PDF patológico de centenas de páginas
+    # não segura o worker)
+    parts = []
+    total = 0
+    try:
+        with closing(iter_pdf_text(file_path)) as pages:
+            for page_text in islice(pages, max_pages):
+                parts.append(page_text)
+                total += len(page_text)
+                if max_chars and total >= max_chars:
+                    break
+    except Exception as e:
+        print(f"Erro ao extrair texto de {file_path}: {e}")
+    return "\n".join(parts).strip()
+
+# pdfplumber mantido para quando o layout (ordem visual das colunas) importar
+def extract_text_from_pdf_plumber(file_path, max_pages=None):
     text = ""
     try:
-        with pdfplumber.open(file_path) as pdf:
+        pages = list(range(1, max_pages + 1)) if max_pages else None
+        with pdfplumber.open(file_path, pages=pages) as pdf:
             for page in pdf.pages:
                 page_text = page.extract_text() or ""
                 text += page_text + "\n"
@@ -44,12 +126,26 @@ def extract_text_from_pdf(file_path):
 # -------------------------------------------------------------------
 # HTML
 # -------------------------------------------------------------------
+# mesmos nós do stripped_strings do BS4: sem script/style/template/comentários
+_HTML_SKIP_TAGS = ("script", "style", "template", etree.Comment)
+
 def extract_text_from_html(file_path):
     try:
-        content = Path(file_path).read_text(encoding="utf-8", errors="ignore")
-        soup = BeautifulSoup(content, "lxml")
-        parts = [s for s in soup.stripped_strings]
-        return " ".join(parts)
+        # bytes direto pro libxml2 (decodifica em C); antes: read_text em
+        # Python + lxml recodificando a str de volta
+        data = Path(file_path).read_bytes()
+        try:
+            # lxml direto (C), sem a árvore do BS4 por cima
+            tree = lxml_html.document_fromstring(data, parser=lxml_html.HTMLParser(encoding="utf-8"))
+        except (etree.LxmlError, ValueError):
+            # HTML vazio → caminho antigo
+            soup = BeautifulSoup(data.decode("utf-8", errors="ignore"), "lxml")
+            return " ".join(soup.stripped_strings)
+        etree.strip_elements(tree, *_HTML_SKIP_TAGS, with_tail=False)
+        # U+FFFD = byte UTF-8 inválido; o read_text(errors="ignore") descartava
+        return " ".join(
+            s for s in (t.replace("\ufffd", "").strip() for t in tree.itertext()) if s
+        )
     except Exception as e:
         print(f"Erro ao ler HTML {file_path}: {e}")
         return ""
@@ -66,9 +162,9 @@ def extract_text_from_doc(file_path):
         # -----------------------------
         if ext == ".docx":
             try:
-                with open(file_path, "rb") as f:
-                    data = f.read()
-                if not zipfile.is_zipfile(io.BytesIO(data)):
+                # is_zipfile no caminho só lê o diretório central no fim do
+                # arquivo (antes: arquivo inteiro em memória + cópia no BytesIO)
+                if not zipfile.is_zipfile(file_path):
                     print(f"[SKIP] DOCX corrompido → {file_path}")
                     return None
             except Exception:
@@ -83,16 +179,24 @@ def extract_text_from_doc(file_path):
         # 2) DOC — detectar HTML fake
         # -----------------------------
         elif ext == ".doc":
+            # um open só: cabeçalho pro sniff, depois seek(0) e o mesmo
+            # handle vai pro mammoth
             with open(file_path, "rb") as f:
-                head = f.read(300).lower()
+                head = f.read(300)
 
-            # HTML disfarçado
-            if b"<html" in head or b"<!doctype html" in head:
-                print(f"[SKIP] .doc é HTML disfarçado → {file_path}")
-                return None
+                # mammoth só lê DOCX (zip): .doc que não começa com a
+                # assinatura zip (OLE2 binário, RTF, PDF...) falharia nele
+                if not head.startswith(ZIP_MAGIC):
+                    head = head.lower()
+                    # HTML disfarçado
+                    if b"<html" in head or b"<!doctype html" in head:
+                        print(f"[SKIP] .doc é HTML disfarçado → {file_path}")
+                    else:
+                        print(f"[SKIP] .doc não é DOCX (OLE2/RTF/outro) → {file_path}")
+                    return None
 
-            # extrair texto com mammoth
-            with open(file_path, "rb") as f:
+                # extrair texto com mammoth
+                f.seek(0)
                 result = mammoth.extract_raw_text(f)
             return result.value.strip()
 
@@ -101,49 +205,78 @@ def extract_text_from_doc(file_path):
 
     return None
 
+# -------------------------------------------------------------------
+# Chave de conteúdo (cache de extração)
+# -------------------------------------------------------------------
+def file_content_key(file_path):
+    # sha1 do primeiro 1 MiB + tamanho: basta para identificar a mesma ata
+    # baixada por URLs/caminhos diferentes, sem ler PDFs grandes inteiros
+    p = Path(file_path)
+    h = hashlib.sha1(usedforsecurity=False)
+    with open(p, "rb") as f:
+        h.update(f.read(CONTENT_KEY_BYTES))
+    return f"{h.hexdigest()}_{p.stat().st_size}"
+
+# -------------------------------------------------------------------
+# Despacho por extensão (usado pelo run_extraction_parallel)
+# -------------------------------------------------------------------
+_EXTRACTORS = {
+    ".pdf": extract_text_from_pdf,
+    ".doc": extract_text_from_doc,
+    ".docx": extract_text_from_doc,
+    ".html": extract_text_from_html,
+    ".htm": extract_text_from_html,
+}
+
+def extract_text_from_file(file_path):
+    # extensão sem extractor → None (formato não suportado)
+    extractor = _EXTRACTORS.get(Path(file_path).suffix.lower())
+    return extractor(file_path) if extractor else None
+
 # -------------------------------------------------------------------
 # Detectores de metadados simples
 # -------------------------------------------------------------------
+# endpos=500 no lugar de text[:500].lower(): sem cópia nem lower do trecho
 def detect_meeting_type(text):
-    text_lower = text[:500].lower()
-    if any(k in text_lower for k in KEYWORDS_COMITE):
+    if _COMITE_RE.search(text, 0, 500):
         return "Comitê de Investimentos"
-    if any(k in text_lower for k in KEYWORDS_CONSELHO):
+    if _CONSELHO_RE.search(text, 0, 500):
         return "Conselho"
     return "Desconhecido"
 
 def extract_meeting_date(text):
-    text_lower = text[:500].lower()
-    for pattern in DATE_PATTERNS:
-        m = re.search(pattern, text_lower)
-        if m:
-            return m.group()
+    m = _DATE_RE.search(text, 0, 500)
+    if m:
+        return m.group().lower()
     return "Data não identificada"
 
 # -------------------------------------------------------------------
 # Loop principal de metadados
 # -------------------------------------------------------------------
-def extract_metadata_from_files(downloaded_files, rpps_info=None):
-    all_metadata = []
+def build_metadata(entry, rpps_info=None, text=None):
+    """
+    Metadados de um arquivo baixado. Sem texto (caso padrão) tipo e data
+    ficam None para a IA; com o texto extraído (run_metadata_parallel) saem
+    dos detectores simples acima.
+    """
+    file_path = Path(entry["file_path"])
+    return {
+        "rpps": entry.get("rpps") or (rpps_info["name"] if rpps_info else None),
+        "uf": entry.get("uf") or (rpps_info["uf"] if rpps_info else None),
+        "file_name": file_path.name,
+        "file_path": str(file_path),
+        "formato": file_path.suffix.lower(),
+        "file_url": entry.get("file_url"),
+        "source_page": entry.get("source_page"),
+        "tipo_reuniao": detect_meeting_type(text) if text else None,
+        "data_reuniao": extract_meeting_date(text) if text else None,
+    }
 
+def extract_metadata_from_files(downloaded_files, rpps_info=None):
+    """
+    Gera os metadados arquivo a arquivo (streaming, como o
+    run_discovery_streaming); quem precisa da lista inteira usa list(...).
+    """
     for entry in downloaded_files:
-        file_path = Path(entry["file_path"])
-        ext = file_path.suffix.lower()
-
-        # NÃO extraímos mais texto — IA fará isso depois
-        text = ""  
-
-        # metadados mínimos
-        all_metadata.append({
-            "rpps": entry.get("rpps") or (rpps_info["name"] if rpps_info else None),
-            "uf": entry.get("uf") or (rpps_info["uf"] if rpps_info else None),
-            "file_name": file_path.name,
-            "file_path": str(file_path),
-            "formato": ext,
-            "file_url": entry.get("file_url"),
-            "source_page": entry.get("source_page"),
-            "tipo_reuniao": None,  # IA vai descobrir
-            "data_reuniao": None    # IA vai descobrir
-        })
-
-    return all_metadata
+        # NÃO extraímos mais texto — IA fará isso depois (metadados mínimos)
+        yield build_metadata(entry, rpps_info)
@@ -0,0 +1,442 @@
+"""
+Parse estático de páginas HTML do discovery (parte CPU do crawl).
+
+Módulo separado e leve de importar (sem Selenium nem as Sessions e caches
+de rede do discovery): os workers do pool de parse desserializam parse_page
+daqui.
+"""
+
+import re
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from .downloader import is_probably_meeting_document  # filtro semântico reaproveitado
+from .utils import parse_url
+
+URL_CACHE_SIZE = 16384       # entradas do lru_cache dos helpers de URL
+
+DOC_EXTS = (".pdf", ".doc", ".docx", ".xls", ".xlsx", ".htm", ".html")
+
+# Heurística de contexto de atas
+HEUR_KEYWORDS = [
+    "ata", "atas",
+    "reuni", "reunião", "reuniao",
+    "comit", "comitê", "comite",
+    "invest", "investimento", "investimentos",
+    "conselho", "consel", "deliberativo", "fiscal",
+]
+
+# URLs que nunca ou quase nunca interessam para atas
+GLOBAL_BLACKLIST_SUBSTR = [
+    "diariomunicipal", "diario-oficial", "diariooficial",
+    "licitacao", "licitacoes", "pregao", "compras",
+    "edital", "concurso",
+    "legislacao", "legislação", "lei", "leis",
+    "noticia", "notícias", "noticias",
+    "ouvidoria",
+    "portal-da-transparencia", "portal_transparencia", "transparencia",
+    "contato", "fale-conosco", "faleconosco",
+    "login", "auth", "sso", "senha",
+    "rh", "recursos-humanos",
+]
+# url_blacklisted compara contra a URL em minúsculas
+assert all(b == b.lower() for b in GLOBAL_BLACKLIST_SUBSTR)
+
+# pré-filtros: uma única varredura (regex em C) no lugar de ~15 testes `in`
+# por URL — a maioria das URLs não contém nenhuma das palavras
+_BLACKLIST_RE = re.compile("|".join(map(re.escape, GLOBAL_BLACKLIST_SUBSTR)))
+_HEUR_ANY_RE = re.compile("|".join(map(re.escape, HEUR_KEYWORDS)))
+
+# varredura única das palavras de HEUR_KEYWORDS (papel de um Aho–Corasick):
+# o lookahead devolve, em cada posição, a palavra mais longa que começa ali;
+# as mais curtas que são prefixo dela ("ata" em "atas") vêm de _HEUR_IMPLIED
+_HEUR_SCAN_RE = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(set(HEUR_KEYWORDS), key=len, reverse=True))) + "))"
+)
+_HEUR_IMPLIED = {
+    k: frozenset(p for p in HEUR_KEYWORDS if k.startswith(p)) for k in HEUR_KEYWORDS
+}
+
+# padrões usados dentro de loops por página/elemento, compilados uma vez
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+_JS_DOC_URL_RE = re.compile(r'["\'](https?://[^"\']+\.(?:pdf|docx?|xlsx?))["\']', re.I)
+_WPDM_ATTR_RE = re.compile(r'href=["\']([^"\']+\?wpdmdl=\d+)', re.I)
+
+# extensão de arquivo no fim do path (antes da query), montada de DOC_EXTS
+_FILE_EXT_RE = re.compile(
+    r"^[^?]*(?:" + "|".join(map(re.escape, DOC_EXTS)) + r")(?:\?|\Z)", re.I
+)
+
+# hubs de download: palavra no path + chave de categoria na query com valor
+# (parse_qs descarta chave sem valor, então "cat=" sozinho não conta)
+HUB_PATH_TERMS = ("download", "arquivo", "document", "docs", "publica")
+HUB_QUERY_KEYS = ("cat", "categoria", "idcategoria", "tipo", "idcat")
+_HUB_PATH_RE = re.compile("|".join(map(re.escape, HUB_PATH_TERMS)), re.I)
+_HUB_QUERY_RE = re.compile(
+    r"(?:^|&)(?:" + "|".join(HUB_QUERY_KEYS) + r")=[^&]", re.I
+)
+
+# ----------------------------------------------------------------------
+# Helpers básicos
+# (puros e chamados várias vezes por âncora; as mesmas URLs de menu/rodapé
+#  se repetem entre páginas e entre sites, então o cache é global)
+# ----------------------------------------------------------------------
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def domain_of(url: str) -> str:
+    try:
+        return parse_url(url).netloc
+    except Exception:
+        return ""
+
+
+def same_domain(a: str, b: str) -> bool:
+    return domain_of(a) == domain_of(b)
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def url_blacklisted(url: str) -> bool:
+    if not url:
+        return False
+    return _BLACKLIST_RE.search(url.lower()) is not None
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def looks_like_file(url: str) -> bool:
+    if not url:
+        return False
+    return _FILE_EXT_RE.search(url) is not None
+
+
+# hrefs que exigem o urljoin completo (segmentos ./.. ou \t\r\n no meio)
+_JOIN_SLOW_RE = re.compile(r"/\.|[\t\r\n]")
+
+
+def split_base(base_url: str):
+    """
+    Quebra a URL base uma única vez por página → (base_url, scheme, netloc).
+    """
+    parts = urlsplit(base_url)
+    return base_url, parts.scheme, parts.netloc
+
+
+def resolve_href(base, href: str) -> str:
+    """
+    urljoin com atalho para os casos comuns (absoluto, //host, /caminho),
+    que são >90% das âncoras; o resto cai no urljoin normal.
+    `base` vem de split_base().
+    """
+    base_url, scheme, netloc = base
+    if scheme in ("http", "https") and _JOIN_SLOW_RE.search(href) is None:
+        if href.startswith(("http://", "https://", "//")):
+            # só com host não vazio ("///x", "http://" ficam pro urljoin)
+            host_start = href.index("//") + 2
+            if href[host_start:host_start + 1] not in ("", "/", "?", "#"):
+                return href if href[0] != "/" else f"{scheme}:{href}"
+        elif href.startswith("/"):
+            return f"{scheme}://{netloc}{href}"
+    return urljoin(base_url, href)
+
+
+def is_same_host(base, url: str) -> bool:
+    # evita parsear links do próprio host (caso comum) comparando o prefixo
+    _, scheme, netloc = base
+    origin = f"{scheme}://{netloc}"
+    if url.startswith(origin) and url[len(origin):len(origin) + 1] in ("", "/", "?", "#"):
+        return True
+    return domain_of(url) == netloc
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def is_download_hub_candidate(url: str) -> bool:
+    """
+    Heurística para páginas tipo "downloads.php?cat=7" (Jaraguá do Sul, etc.):
+    - path contendo download(s)/arquivo/documento
+    - OU query com chaves tipo cat, categoria, tipo, idCategoria etc.
+    """
+    if not url:
+        return False
+    parsed = parse_url(url)
+    return (
+        _HUB_PATH_RE.search(parsed.path) is not None
+        and _HUB_QUERY_RE.search(parsed.query) is not None
+    )
+
+# ----------------------------------------------------------------------
+# Score de links (priorizar coisas relevantes)
+# ----------------------------------------------------------------------
+
+# termos fixos do score, compilados uma vez (element_text_score roda
+# dezenas de milhares de vezes por crawl)
+DOC_HREF_HINTS = ("ata", "atas", "download", "downloads", "arquivo", "document", "docs")
+NAV_PENALTY_TERMS = ("portal da transparência", "transparência", "transparencia",
+                     "ouvidoria", "noticia", "notícias")
+_DOC_HREF_RE = re.compile("|".join(map(re.escape, DOC_HREF_HINTS)))
+_NAV_PENALTY_RE = re.compile("|".join(map(re.escape, NAV_PENALTY_TERMS)))
+
+def element_text_score(text: str, href: str) -> int:
+    """
+    Pontua um link com base no texto anchora + URL.
+    """
+    score = 0
+    t = (text or "").lower()
+    h = (href or "").lower()
+    full = t + " " + h
+
+    hits = set()
+    for k in _HEUR_SCAN_RE.findall(full):
+        hits |= _HEUR_IMPLIED[k]
+    score += 8 * len(hits)
+
+    # páginas que costumam ter docs
+    if _DOC_HREF_RE.search(h):
+        score += 6
+
+    # anos
+    if _YEAR_RE.search(full):
+        score += 6
+
+    # penalização se for claramente navegação genérica
+    if _NAV_PENALTY_RE.search(full):
+        score -= 12
+
+    if url_blacklisted(h):
+        score -= 20
+
+    return score
+
+
+# ----------------------------------------------------------------------
+# Parse de HTML — lxml em modo target (eventos SAX em C, sem montar árvore)
+# só precisamos de href/texto das âncoras e src de iframe/embed/object
+# ----------------------------------------------------------------------
+
+class _LinkCollector:
+    """
+    Target do etree.HTMLParser: recebe start/end/data do libxml2 e guarda só
+    as <a href> (com texto igual ao get_text(strip=True) do BS4, sem
+    <script>/<style>) e os src/data de iframe/embed/object.
+    """
+    __slots__ = ("anchors", "embeds", "_open", "_a_open", "_skip", "_buf", "_parts")
+
+    def __init__(self):
+        self.anchors = []
+        self.embeds = []
+        self._open = []    # pilha de abertos: índice da âncora, -1 = script/style, None = resto
+        self._a_open = 0
+        self._skip = 0
+        self._buf = []     # pedaços do nó de texto atual (só dentro de <a>)
+        self._parts = []   # textos de cada âncora
+
+    def _flush(self):
+        # fim de um nó de texto: strip do nó inteiro, como no get_text(strip=True)
+        text = "".join(self._buf).strip()
+        self._buf = []
+        if text:
+            for idx in self._open:
+                if idx is not None and idx >= 0:
+                    self._parts[idx].append(text)
+
+    def start(self, tag, attrs):
+        if self._buf:
+            self._flush()
+        idx = None
+        if tag == "a":
+            href = attrs.get("href")
+            if href is not None:
+                idx = len(self.anchors)
+                self.anchors.append(href)
+                self._parts.append([])
+                self._a_open += 1
+        elif tag in ("iframe", "embed", "object"):
+            self.embeds.append(attrs.get("src") or attrs.get("data"))
+        elif tag in ("script", "style"):
+            self._skip += 1
+            idx = -1
+        self._open.append(idx)
+
+    def end(self, tag):
+        if self._buf:
+            self._flush()
+        idx = self._open.pop()
+        if idx == -1:
+            self._skip -= 1
+        elif idx is not None:
+            self._a_open -= 1
+
+    def data(self, text):
+        if self._a_open and not self._skip:
+            self._buf.append(text)
+
+    def comment(self, text):
+        # comentário separa nós de texto
+        if self._buf:
+            self._flush()
+
+    def close(self):
+        if self._buf:
+            self._flush()
+        anchors = [(href, "".join(parts)) for href, parts in zip(self.anchors, self._parts)]
+        return anchors, self.embeds
+
+
+def extract_links(html: str):
+    """
+    Uma única passada no HTML: ([(href, texto)] das <a href>,
+    [src/data] de iframe/embed/object), ambos na ordem do documento.
+    Cai no BS4 se o lxml recusar o HTML.
+    """
+    try:
+        return etree.fromstring(html, etree.HTMLParser(target=_LinkCollector()))
+    except (etree.LxmlError, ValueError):
+        pass
+
+    anchors = []
+    embeds = []
+    soup = BeautifulSoup(html, "lxml")
+    for tag in soup.find_all(["a", "iframe", "embed", "object"]):
+        if tag.name == "a":
+            if tag.get("href") is not None:
+                anchors.append((tag["href"], tag.get_text(strip=True) or ""))
+        else:
+            embeds.append(tag.get("src") or tag.get("data"))
+    return anchors, embeds
+
+
+def collect_docs_from_links(base, anchors, embed_srcs):
+    """
+    Filtro de documentos sobre (href, texto) das âncoras e src dos embeds.
+    Compartilhado entre o parse de HTML e a coleta via JS no Selenium.
+    `base` vem de split_base().
+    """
+    found = []
+
+    # anchors diretos
+    for href, text in anchors:
+        abs_url = resolve_href(base, href.strip())
+
+        # excluir lixo
+        if url_blacklisted(abs_url):
+            continue
+
+        # arquivos diretos
+        if looks_like_file(abs_url):
+            fname = abs_url.rpartition("/")[2]
+            if is_probably_meeting_document(fname) or is_probably_meeting_document(text):
+                found.append(abs_url)
+            continue
+
+        # páginas de download
+        lower_url = abs_url.lower()
+        if "download" in lower_url or "arquivo" in lower_url:
+            if _HEUR_ANY_RE.search(text.lower() + " " + lower_url):
+                found.append(abs_url)
+
+    # iframe/embed/object
+    for src in embed_srcs:
+        if not src:
+            continue
+        abs_url = resolve_href(base, src)
+        if url_blacklisted(abs_url):
+            continue
+        if looks_like_file(abs_url):
+            if is_probably_meeting_document(abs_url.rpartition("/")[2]):
+                found.append(abs_url)
+        elif "download" in abs_url.lower():
+            found.append(abs_url)
+
+    return found
+
+
+def extract_docs_from_html(base_url: str, html: str, links=None):
+    """
+    Extrai links de documentos a partir de HTML, incluindo:
+    - PDFs diretos
+    - DOC/DOCX
+    - links de hubs de download
+    - plugins como WP Download Manager (wpdmdl)
+    `links` = resultado de extract_links(html), quando já calculado.
+    """
+    if not html:
+        return []
+
+    base = split_base(base_url)
+    anchors, embeds = links if links is not None else extract_links(html)
+
+    # 1) anchors diretos + 2) iframe/embed/object
+    found = collect_docs_from_links(base, anchors, embeds)
+
+    # 3) padrões de PDF embutidos em JS
+    for m in _JS_DOC_URL_RE.findall(html):
+        if not url_blacklisted(m):
+            if is_probably_meeting_document(m.rpartition("/")[2]):
+                found.append(m)
+
+    # 4) Hubs tipo downloads.php?cat=xx
+    if is_download_hub_candidate(base_url):
+        found.append(base_url)
+
+    # 5) *** PATCH PARA SITES COM wpdmdl (ex: IPREV/SC) ***
+    wpdmdl_matches = _WPDM_ATTR_RE.findall(html)
+    for u in wpdmdl_matches:
+        abs_url = resolve_href(base, u)
+        found.append(abs_url)
+
+    # dedupe mantendo a ordem
+    return list(dict.fromkeys(found))
+
+def extract_internal_links(base_url: str, html: str, links=None):
+    """
+    Retorna links internos (mesmo domínio) com score de relevância.
+    `links` = resultado de extract_links(html), quando já calculado.
+    """
+    if not html:
+        return []
+
+    base = split_base(base_url)
+    # url → (melhor score, posição dessa ocorrência); menus repetem os mesmos links,
+    # então só os distintos com score > 0 chegam ao sort
+    best = {}
+
+    anchors = links[0] if links is not None else extract_links(html)[0]
+    for pos, (href, text) in enumerate(anchors):
+        abs_url = resolve_href(base, href.strip())
+
+        if url_blacklisted(abs_url):
+            continue
+
+        if not is_same_host(base, abs_url):
+            continue
+
+        score = element_text_score(text, abs_url)
+
+        # boost se parece hub (?cat=7, downloads.php etc.)
+        if is_download_hub_candidate(abs_url):
+            score += 30
+
+        if score > 0:
+            prev = best.get(abs_url)
+            if prev is None or score > prev[0]:
+                best[abs_url] = (score, pos)
+
+    # score desc; empate → ordem da página (mesmo resultado do sort estável)
+    ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], kv[1][1]))
+    return [(score, url) for url, (score, _) in ranked]
+
+
+def parse_page(url: str, html: str):
+    """
+    Parte CPU da página: documentos + links internos pontuados.
+    Top-level para poder rodar no pool de processos (picklável).
+    Retorna (docs, internal_scored).
+    """
+    if not html:
+        return [], []
+    links = extract_links(html)  # parse único, reaproveitado pelos dois
+    return (
+        extract_docs_from_html(url, html, links),
+        extract_internal_links(url, html, links),
+    )
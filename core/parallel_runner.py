@@ -1,5 +1,10 @@
 # core/parallel_runner.py
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from .extractor import build_metadata, extract_text_from_file, file_content_key
 
 def run_discovery_parallel(sites, crawl_func, workers=4):
     """
@@ -32,7 +37,6 @@ def run_discovery_parallel(sites, crawl_func, workers=4):
 # PIPELINE STREAMING — Discovery em paralelo entregando resultados
 # assim que cada site termina (não bloqueia tudo antes).
 # ===============================================================
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 def run_discovery_streaming(rpps_sites, discovery_fn, workers=4):
     """
@@ -54,3 +58,88 @@ def run_discovery_streaming(rpps_sites, discovery_fn, workers=4):
             print(f"[DISCOVERY][ERRO] {site['name']}: {e}")
             links = []
         yield site, links
+
+# ===============================================================
+# EXTRAÇÃO DE TEXTO — CPU-bound (PDF via pypdfium2, DOC/DOCX via
+# mammoth/python-docx em Python puro, HTML via lxml), então processos
+# em vez de threads: cada worker tem seu próprio GIL.
+# ===============================================================
+def _extract_one(file_path):
+    # nível de módulo: precisa ser picklável para o ProcessPoolExecutor
+    return extract_text_from_file(file_path)
+
+def run_extraction_parallel(downloaded_files, workers=None, cache_dir=None):
+    """
+    Extrai o texto dos arquivos baixados em paralelo (um processo por core),
+    devolvendo (entry, texto) conforme cada arquivo termina.
+    - downloaded_files: saída do download_files_parallel
+    - workers: default os.cpu_count()
+    - cache_dir: se dado, texto já extraído fica em <cache_dir>/<chave>.txt
+      e reexecuções (ou a mesma ata em outro caminho) só leem o arquivo
+    Arquivos com o mesmo conteúdo (file_content_key) são extraídos uma vez.
+    """
+    workers = workers or os.cpu_count() or 1
+    cache_path = Path(cache_dir) if cache_dir else None
+    if cache_path:
+        cache_path.mkdir(parents=True, exist_ok=True)
+
+    # chave de conteúdo → entries com esse conteúdo
+    groups = {}
+    for entry in downloaded_files:
+        try:
+            # extensão na chave: o extractor escolhido depende dela
+            key = file_content_key(entry["file_path"]) + Path(entry["file_path"]).suffix.lower()
+        except OSError as e:
+            print(f"[EXTRACTION][ERRO] {entry.get('file_path')}: {e}")
+            yield entry, None
+            continue
+        groups.setdefault(key, []).append(entry)
+
+    pending = {}
+    for key, entries in groups.items():
+        cached = cache_path / f"{key}.txt" if cache_path else None
+        if cached and cached.exists():
+            text = cached.read_text(encoding="utf-8")
+            for entry in entries:
+                yield entry, text
+        else:
+            pending[key] = entries
+
+    if not pending:
+        return
+
+    # forkserver: o app chama isto de dentro do pool de threads dos sites, e
+    # fork de processo com várias threads pode herdar lock preso
+    ctx = multiprocessing.get_context("forkserver")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        futures = {
+            executor.submit(_extract_one, entries[0]["file_path"]): key
+            for key, entries in pending.items()
+        }
+
+        for future in as_completed(futures):
+            key = futures[future]
+            entries = pending[key]
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"[EXTRACTION][ERRO] {entries[0].get('file_path')}: {e}")
+                text = None
+
+            # None = formato não suportado / arquivo inválido → não cacheia
+            if cache_path and text is not None:
+                tmp = cache_path / f".{key}.txt.part"
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, cache_path / f"{key}.txt")
+
+            for entry in entries:
+                yield entry, text
+
+def run_metadata_parallel(downloaded_files, rpps_info=None, workers=None, cache_dir=None):
+    """
+    Versão com texto do extract_metadata_from_files: extrai em paralelo
+    (run_extraction_parallel) e gera os metadados de cada arquivo assim que
+    o texto dele fica pronto — tipo e data da reunião saem do próprio texto.
+    """
+    for entry, text in run_extraction_parallel(downloaded_files, workers, cache_dir):
+        yield build_metadata(entry, rpps_info, text)
@@ -3,7 +3,14 @@ esse script é de funcoes utilitarias genericas usadas em ttodo o projeto
 exemplo: criacao de diretorios organizados por UF e nome do RPPS
 """
 
+import socket
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+DNS_CACHE_TTL = 300  # segundos que uma resolução de host fica valendo
 
 def setup_directories(name, uf, base_out):
     # cria o diretório base no formato ./data/UF/Nome_RPPS
@@ -11,3 +18,40 @@ def setup_directories(name, uf, base_out):
     path = Path(base_out) / uf / safe_name
     path.mkdir(parents=True, exist_ok=True)
     return path
+
+# urlparse cacheado — as mesmas URLs passam várias vezes pelo discovery e
+# pelo downloader; o ParseResult é imutável, então pode ser compartilhado
+@lru_cache(maxsize=8192)
+def parse_url(url):
+    return urlparse(url)
+
+# idem para nomes de arquivo vindos de URL (%20, %C3%A7...)
+unquote_cached = lru_cache(maxsize=4096)(unquote)
+
+# ----------------------------------------------------------------------
+# Cache de DNS — cada conexão nova (pool cheio, host novo, retry) chamava
+# getaddrinfo de novo; com centenas de downloads no mesmo punhado de hosts
+# isso é latência fixa repetida. Cache com TTL, só de respostas válidas.
+# ----------------------------------------------------------------------
+_orig_getaddrinfo = socket.getaddrinfo
+_dns_cache = {}
+_dns_cache_lock = threading.Lock()
+
+
+def _cached_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    key = (host, port, family, type, proto, flags)
+    now = time.monotonic()
+    with _dns_cache_lock:
+        hit = _dns_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    # erro de resolução não entra no cache (a exceção sobe daqui)
+    result = _orig_getaddrinfo(host, port, family, type, proto, flags)
+    with _dns_cache_lock:
+        _dns_cache[key] = (now + DNS_CACHE_TTL, result)
+    return result
+
+
+def install_dns_cache():
+    # troca o socket.getaddrinfo do processo (requests/urllib3 usam ele)
+    socket.getaddrinfo = _cached_getaddrinfo